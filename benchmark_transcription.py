@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark transcription modes on the recordings in audio_samples/: sequential
+against the parallel chunked long-audio mode (default), or the int8 cpu-fast
+mode against fp32 (--compare precision), reporting real-time factor and WER drift.
+"""
+
+import argparse
+import glob
+import os
+import re
+import time
+
+from src.long_audio import transcribe_long_audio
+from src.transcriber import CPU_THREADS, get_model, transcribe_audio
+
+AUDIO_DIR = "audio_samples"
+
+
+def audio_duration(path):
+    from pydub import AudioSegment
+    return len(AudioSegment.from_file(path)) / 1000
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by the reference length"""
+    ref = re.findall(r"[\w']+", reference.lower())
+    hyp = re.findall(r"[\w']+", hypothesis.lower())
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def audio_files():
+    return sorted(glob.glob(os.path.join(AUDIO_DIR, "*.wav")) + glob.glob(os.path.join(AUDIO_DIR, "*.mp3")))
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main(model_size="base", workers=None, chunk_seconds=60):
+    files = audio_files()
+    if not files:
+        print(f"No audio files found in {AUDIO_DIR}/")
+        return
+
+    # Load once up front so the sequential timings measure decoding, not model loading
+    get_model(model_size, "cpu")
+
+    print(f"Model: {model_size}, workers: {workers or os.cpu_count()}, chunk: {chunk_seconds}s")
+    print("(chunked timings include starting the pool and loading one model per worker)")
+    print(f"{'file':<28}{'audio':>8}{'sequential':>12}{'chunked':>10}{'speedup':>9}")
+    for path in files:
+        duration = audio_duration(path)
+        _, sequential = timed(transcribe_audio, path, model_size=model_size, device="cpu")
+        _, chunked = timed(transcribe_long_audio, path, model_size=model_size, workers=workers, chunk_seconds=chunk_seconds)
+        print(
+            f"{os.path.basename(path):<28}{duration:>7.1f}s{sequential:>11.1f}s{chunked:>9.1f}s"
+            f"{sequential / chunked:>8.2f}x"
+        )
+
+
+def main_precision(model_size="base"):
+    """fp32 vs int8 cpu-fast on CPU; WER of cpu-fast is measured against the fp32 text"""
+    files = audio_files()
+    if not files:
+        print(f"No audio files found in {AUDIO_DIR}/")
+        return
+
+    # Load both up front so the timings measure decoding, not loading/quantizing
+    get_model(model_size, "cpu")
+    get_model(model_size, precision="cpu-fast")
+
+    print(f"Model: {model_size}, cpu-fast threads: {CPU_THREADS}")
+    print("RTF = processing time / audio duration (lower is faster)")
+    print(f"{'file':<28}{'audio':>8}{'fp32 RTF':>10}{'int8 RTF':>10}{'speedup':>9}{'WER drift':>11}")
+    total_audio = total_fp32 = total_int8 = 0.0
+    for path in files:
+        duration = audio_duration(path)
+        reference, fp32 = timed(transcribe_audio, path, model_size=model_size, device="cpu")
+        hypothesis, int8 = timed(transcribe_audio, path, model_size=model_size, precision="cpu-fast")
+        total_audio += duration
+        total_fp32 += fp32
+        total_int8 += int8
+        print(
+            f"{os.path.basename(path):<28}{duration:>7.1f}s{fp32 / duration:>10.3f}{int8 / duration:>10.3f}"
+            f"{fp32 / int8:>8.2f}x{word_error_rate(reference, hypothesis):>10.1%}"
+        )
+    if total_audio:
+        print(f"{'overall':<28}{total_audio:>7.1f}s{total_fp32 / total_audio:>10.3f}{total_int8 / total_audio:>10.3f}"
+              f"{total_fp32 / total_int8:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default="base", help="Whisper model size")
+    parser.add_argument("--compare", choices=["chunked", "precision"], default="chunked",
+                        help="chunked: sequential vs parallel chunks; precision: fp32 vs int8 cpu-fast")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for the chunked mode (default: all cores)")
+    parser.add_argument("--chunk-seconds", type=int, default=60, help="Target chunk length for the chunked mode")
+    args = parser.parse_args()
+    if args.compare == "precision":
+        main_precision(model_size=args.model)
+    else:
+        main(model_size=args.model, workers=args.workers, chunk_seconds=args.chunk_seconds)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compare fast (gazetteer) entity extraction against the full scispaCy + UMLS
+pipeline: latency per transcript and agreement of the categorized output.
+
+Agreement counts (category, mention) pairs after categorize_entities; the full
+pipeline is the reference, so precision is how much of the fast output the full
+pipeline also produced and recall is how much of the full output fast mode found.
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from src.entity_extractor import ENTITY_CATEGORIES, categorize_entities, extract_entities, extract_entities_fast, get_pipeline
+from src.gazetteer import get_gazetteer
+
+TRANSCRIPT_DIR = "transcripts"
+
+
+def load_transcripts(from_db=0):
+    if from_db:
+        from src.db_reader import iter_backfill_rows
+
+        texts = []
+        for row in iter_backfill_rows():
+            texts.append((row["session_id"], row["transcript"]))
+            if len(texts) >= from_db:
+                break
+        return texts
+    paths = sorted(glob.glob(os.path.join(TRANSCRIPT_DIR, "*.txt")))
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append((os.path.basename(path), f.read()))
+    return texts
+
+
+def mention_pairs(structured_data):
+    return {
+        (category, " ".join(mention.lower().split()))
+        for category in ENTITY_CATEGORIES if category != "other"
+        for mention in structured_data[category]
+    }
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(from_db=0):
+    transcripts = load_transcripts(from_db)
+    if not transcripts:
+        print(f"No transcripts found in {TRANSCRIPT_DIR}/")
+        return
+
+    # Build both up front so the timings measure extraction, not loading
+    get_pipeline()
+    get_gazetteer()
+
+    modes = [
+        ("full", lambda text: extract_entities(text)),
+        ("fast", lambda text: extract_entities_fast(text, fallback="none")),
+        ("fast+fallback", lambda text: extract_entities_fast(text, fallback="unmatched")),
+    ]
+    totals = {name: {"ms": 0.0, "tp": 0, "fast": 0, "full": 0} for name, _ in modes}
+
+    print(f"{'transcript':<32}" + "".join(f"{name + ' ms':>18}" for name, _ in modes))
+    for name, text in transcripts:
+        reference = None
+        row = f"{name[:31]:<32}"
+        for mode, extract in modes:
+            entities, elapsed = timed(extract, text)
+            pairs = mention_pairs(categorize_entities(entities))
+            if reference is None:
+                reference = pairs
+            stats = totals[mode]
+            stats["ms"] += elapsed
+            stats["tp"] += len(pairs & reference)
+            stats["fast"] += len(pairs)
+            stats["full"] += len(reference)
+            row += f"{elapsed:>18.1f}"
+        print(row)
+
+    print(f"\n{'mode':<16}{'mean ms':>10}{'precision':>11}{'recall':>9}")
+    for mode, _ in modes:
+        stats = totals[mode]
+        precision = stats["tp"] / stats["fast"] if stats["fast"] else 1.0
+        recall = stats["tp"] / stats["full"] if stats["full"] else 1.0
+        print(f"{mode:<16}{stats['ms'] / len(transcripts):>10.1f}{precision:>11.1%}{recall:>9.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-db", type=int, default=0, metavar="N",
+                        help="Use the first N stored transcripts instead of transcripts/*.txt")
+    args = parser.parse_args()
+    main(from_db=args.from_db)
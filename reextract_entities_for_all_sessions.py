@@ -2,57 +2,22 @@
 """
 Re-extract medical entities for all sessions in the database using the improved extraction logic,
 and update the consultations table accordingly.
+
+Sessions whose stored entities were already extracted from the same transcript
+(by content hash) with the current extractor version are skipped unless --force is given.
 """
 
+from src.backfill import DEFAULT_CHECKPOINT_PATH, is_up_to_date, iter_stale_rows, preserve_patient_info, run_parallel_backfill
 from src.db_reader import get_session_ids, get_consultation_transcript, get_consultation_by_session
-from src.entity_extractor import extract_entities, categorize_entities
-import mysql.connector
-import json
-
-# DB connection settings (should match your project)
-DB_CONFIG = dict(
-    host="localhost",
-    user="root",
-    password="cyril01",
-    database="telemed_db",
-    auth_plugin="mysql_native_password"
-)
-
-def update_structured_data(session_id, structured_data):
-    """Update the structured_data fields in the consultations table for a session."""
-    connection = mysql.connector.connect(**DB_CONFIG)
-    cursor = connection.cursor()
-    query = """
-        UPDATE consultations SET
-            patient_age = %s,
-            patient_gender = %s,
-            symptoms = %s,
-            medications = %s,
-            procedures = %s,
-            instructions = %s,
-            diagnosis = %s
-        WHERE session_id = %s
-    """
-    values = (
-        structured_data["patient_info"]["age"],
-        structured_data["patient_info"]["gender"],
-        json.dumps(structured_data.get("symptoms", [])),
-        json.dumps(structured_data.get("medications", [])),
-        json.dumps(structured_data.get("procedures", [])),
-        json.dumps(structured_data.get("instructions", [])),
-        json.dumps(structured_data.get("diagnosis", [])),
-        session_id
-    )
-    cursor.execute(query, values)
-    connection.commit()
-    cursor.close()
-    connection.close()
+from src.db_connection import pool_stats
+from src.db_schema import ensure_schema
+from src.db_writer import update_structured_data, bulk_update_structured_data
+from src.entity_extractor import extract_entities_batch, categorize_entities, extractor_version, span_cache_stats, transcript_hash
+import argparse
 
-def main():
-    session_ids = get_session_ids()
-    print(f"Found {len(session_ids)} sessions in the database.")
+def iter_transcripts(session_ids, force=False, counts=None):
+    """Yield (transcript, (session_id, existing_patient_info, transcript_hash)) pairs for nlp.pipe"""
     for session_id in session_ids:
-        print(f"\nProcessing session: {session_id}")
         transcript = get_consultation_transcript(session_id)
         if not transcript or "not available" in transcript.lower():
             print(f"  ⚠️ No transcript found for session {session_id}, skipping.")
@@ -64,23 +29,114 @@ def main():
         if existing_consultation and "patient_info" in existing_consultation.get("structured_data", {}):
             existing_patient_info = existing_consultation["structured_data"]["patient_info"]
 
-        # Extract and categorize entities from the transcript
-        entities = extract_entities(transcript)
-        structured_data = categorize_entities(entities)
+        source_hash = transcript_hash(transcript)
+        if not force and existing_consultation and is_up_to_date(
+            source_hash, existing_consultation["transcript_hash"], existing_consultation["extractor_version"]
+        ):
+            if counts is not None:
+                counts["unchanged"] += 1
+            continue
+
+        if counts is not None:
+            counts["stale"] += 1
+        yield transcript, (session_id, existing_patient_info, source_hash)
+
+def report_dry_run(rows, counts):
+    """Count what a real run would recompute, without loading the NLP pipeline"""
+    for _ in rows:
+        pass
+    print(f"Extractor version: {extractor_version()}")
+    print(f"Dry run: {counts['stale']} sessions would be re-extracted, {counts['unchanged']} are up to date.")
 
-        # Preserve existing age/gender if new extraction didn't find them
-        if not structured_data["patient_info"].get("age") and existing_patient_info.get("age"):
-            structured_data["patient_info"]["age"] = existing_patient_info["age"]
-            print(f"  -> Preserving existing age: {existing_patient_info['age']}")
-        
-        if not structured_data["patient_info"].get("gender") and existing_patient_info.get("gender"):
-            structured_data["patient_info"]["gender"] = existing_patient_info["gender"]
-            print(f"  -> Preserving existing gender: {existing_patient_info['gender']}")
+def main(batch_size=16, n_process=1, force=False, dry_run=False):
+    ensure_schema()
+    session_ids = get_session_ids()
+    print(f"Found {len(session_ids)} sessions in the database.")
+
+    counts = {"stale": 0, "unchanged": 0}
+    if dry_run:
+        report_dry_run(iter_transcripts(session_ids, force, counts), counts)
+        return
+
+    # Extract and categorize entities from the transcripts, streamed in input order
+    results = extract_entities_batch(
+        iter_transcripts(session_ids, force, counts),
+        batch_size=batch_size,
+        n_process=n_process,
+        as_tuples=True
+    )
+    for entities, (session_id, existing_patient_info, source_hash) in results:
+        print(f"\nProcessing session: {session_id}")
+        structured_data = categorize_entities(entities)
+        preserve_patient_info(structured_data, existing_patient_info)
 
         # Update the database with the new, combined data
-        update_structured_data(session_id, structured_data)
+        update_structured_data(session_id, structured_data, entities=entities, source_hash=source_hash)
         print(f"  ✅ Updated structured data for session {session_id}")
-    print("\nAll sessions updated with improved entity extraction!")
+    print(f"\nUpdated {counts['stale']} sessions with improved entity extraction ({counts['unchanged']} already up to date)!")
+    print(f"DB pool stats: {pool_stats()}")
+    print(f"Span cache stats: {span_cache_stats()}")
+
+def main_bulk(batch_size=16, n_process=1, write_batch_size=500, read_page_size=1000, force=False, dry_run=False):
+    """Prefetch transcripts and patient info page by page, write back in batched transactions"""
+    ensure_schema()
+    counts = {"stale": 0, "unchanged": 0}
+    rows = iter_stale_rows(read_page_size, force, counts)
+    if dry_run:
+        report_dry_run(rows, counts)
+        return
+
+    results = extract_entities_batch(rows, batch_size=batch_size, n_process=n_process, as_tuples=True)
+
+    def updates():
+        for entities, (session_id, existing_patient_info, source_hash) in results:
+            structured_data = categorize_entities(entities)
+            preserve_patient_info(structured_data, existing_patient_info, verbose=False)
+            yield session_id, structured_data, entities, source_hash
+
+    written = bulk_update_structured_data(
+        updates(),
+        batch_size=write_batch_size,
+        on_flush=lambda session_ids: print(f"  ✅ Committed {len(session_ids)} sessions (last: {session_ids[-1]})")
+    )
+    print(f"\nUpdated {written} sessions with improved entity extraction ({counts['unchanged']} already up to date)!")
+    print(f"DB pool stats: {pool_stats()}")
+    print(f"Span cache stats: {span_cache_stats()}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=16, help="Transcripts per nlp.pipe batch")
+    parser.add_argument("--n-process", type=int, default=1, help="Worker processes for nlp.pipe (-1 = all cores)")
+    parser.add_argument("--bulk", action="store_true", help="Prefetch with joined queries and write in batched transactions")
+    parser.add_argument("--write-batch-size", type=int, default=500, help="Sessions per write transaction in --bulk mode")
+    parser.add_argument("--read-page-size", type=int, default=1000, help="Sessions per prefetch query in --bulk mode")
+    parser.add_argument("--force", action="store_true", help="Re-extract every session, even if its transcript and extractor are unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many sessions would be re-extracted")
+    parser.add_argument("--workers", type=int, default=0, help="Shard sessions across this many worker processes (implies bulk reads/writes, resumable)")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Sessions per worker task with --workers")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="Checkpoint file of completed sessions with --workers")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    args = parser.parse_args()
+    if args.workers and not args.dry_run:
+        ensure_schema()
+        run_parallel_backfill(
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            write_batch_size=args.write_batch_size,
+            read_page_size=args.read_page_size,
+            checkpoint_path=args.checkpoint,
+            force=args.force,
+            restart=args.restart
+        )
+        print(f"DB pool stats: {pool_stats()}")
+    elif args.bulk or args.workers:
+        main_bulk(
+            batch_size=args.batch_size,
+            n_process=args.n_process,
+            write_batch_size=args.write_batch_size,
+            read_page_size=args.read_page_size,
+            force=args.force,
+            dry_run=args.dry_run
+        )
+    else:
+        main(batch_size=args.batch_size, n_process=args.n_process, force=args.force, dry_run=args.dry_run)
\ No newline at end of file
@@ -0,0 +1,204 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from src.db_reader import count_backfill_sessions, iter_backfill_rows
+from src.db_writer import write_structured_batch
+from src.entity_extractor import categorize_entities_batch, extract_entities_batch, extractor_version, get_pipeline, transcript_hash
+from src.model_client import server_available
+
+# Shared pieces of the entity re-extraction backfill, plus a parallel runner that
+# shards sessions across worker processes and can resume after a crash.
+
+DEFAULT_CHECKPOINT_PATH = ".reextract_checkpoint"
+PROGRESS_INTERVAL_SECONDS = 10
+
+
+def is_up_to_date(source_hash, stored_hash, stored_version):
+    """True when stored entities came from this transcript and the current extractor"""
+    return stored_hash == source_hash and stored_version == extractor_version()
+
+
+def preserve_patient_info(structured_data, existing_patient_info, verbose=True):
+    """Preserve existing age/gender if new extraction didn't find them"""
+    if not structured_data["patient_info"].get("age") and existing_patient_info.get("age"):
+        structured_data["patient_info"]["age"] = existing_patient_info["age"]
+        if verbose:
+            print(f"  -> Preserving existing age: {existing_patient_info['age']}")
+
+    if not structured_data["patient_info"].get("gender") and existing_patient_info.get("gender"):
+        structured_data["patient_info"]["gender"] = existing_patient_info["gender"]
+        if verbose:
+            print(f"  -> Preserving existing gender: {existing_patient_info['gender']}")
+
+
+def iter_stale_rows(read_page_size=1000, force=False, counts=None, skip_ids=None):
+    """Prefetched backfill rows that need re-extraction, as
+    (transcript, (session_id, existing_patient_info, transcript_hash)) pairs"""
+    for row in iter_backfill_rows(page_size=read_page_size):
+        if skip_ids and row["session_id"] in skip_ids:
+            if counts is not None:
+                counts["checkpointed"] += 1
+            continue
+        source_hash = transcript_hash(row["transcript"])
+        if not force and is_up_to_date(source_hash, row["transcript_hash"], row["extractor_version"]):
+            if counts is not None:
+                counts["unchanged"] += 1
+            continue
+        if counts is not None:
+            counts["stale"] += 1
+        yield row["transcript"], (row["session_id"], row["patient_info"], source_hash)
+
+
+class Checkpoint:
+    """Append-only file of session_ids whose results are committed"""
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.completed = {line.strip() for line in f if line.strip()}
+
+    def mark(self, session_ids):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(f"{session_id}\n" for session_id in session_ids)
+            f.flush()
+            os.fsync(f.fileno())
+        self.completed.update(session_ids)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.completed = set()
+
+
+class ProgressReporter:
+    """Periodic sessions/sec, ETA and per-stage timing output"""
+
+    def __init__(self, total, already_done=0):
+        self.total = total
+        self.done = already_done
+        self.processed = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.stage_seconds = {"read": 0.0, "extract": 0.0, "categorize": 0.0, "write": 0.0}
+
+    def add_stage_time(self, stage, seconds):
+        self.stage_seconds[stage] += seconds
+
+    def advance(self, count, processed=True):
+        self.done += count
+        if processed:
+            self.processed += count
+        if time.monotonic() - self.last_report >= PROGRESS_INTERVAL_SECONDS:
+            self.report()
+
+    def report(self, final=False):
+        self.last_report = time.monotonic()
+        elapsed = self.last_report - self.started
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.done, 0)
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "unknown"
+        stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in self.stage_seconds.items())
+        label = "Finished" if final else "Progress"
+        print(f"{label}: {self.done}/{self.total} sessions, {rate:.2f} sessions/sec, ETA {eta} | {stages}")
+
+
+def _init_worker():
+    # Each worker loads its own pipeline once and reuses it for every chunk,
+    # unless a model server is running and holds the only copy
+    if not server_available():
+        get_pipeline()
+
+
+def _extract_chunk(chunk):
+    """Worker: extract and categorize one shard of (transcript, context) pairs"""
+    started = time.monotonic()
+    extracted = list(extract_entities_batch(chunk, batch_size=len(chunk), as_tuples=True))
+    extract_seconds = time.monotonic() - started
+
+    started = time.monotonic()
+    results = []
+    categorized = categorize_entities_batch([entities for entities, _ in extracted])
+    for (entities, (session_id, existing_patient_info, source_hash)), structured_data in zip(extracted, categorized):
+        preserve_patient_info(structured_data, existing_patient_info, verbose=False)
+        results.append((session_id, structured_data, entities, source_hash))
+    return results, {"extract": extract_seconds, "categorize": time.monotonic() - started}
+
+
+def run_parallel_backfill(workers=None, chunk_size=32, write_batch_size=500, read_page_size=1000,
+                          checkpoint_path=DEFAULT_CHECKPOINT_PATH, force=False, restart=False):
+    """Re-extract stale sessions across a process pool, resuming from a checkpoint
+
+    The parent process reads rows and writes results in batched transactions;
+    only the NLP work runs in the workers. A session is added to the
+    checkpoint once its batch has committed, so a crashed run resumes where it
+    stopped. The checkpoint is removed after a clean finish. Returns the
+    number of sessions written.
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint = Checkpoint(checkpoint_path)
+    if restart:
+        checkpoint.clear()
+    if checkpoint.completed:
+        print(f"Resuming: {len(checkpoint.completed)} sessions already completed per {checkpoint_path}")
+
+    counts = {"stale": 0, "unchanged": 0, "checkpointed": 0}
+    progress = ProgressReporter(count_backfill_sessions())
+    rows = iter_stale_rows(read_page_size, force, counts, skip_ids=checkpoint.completed)
+
+    def next_chunk():
+        started = time.monotonic()
+        chunk = []
+        skipped_before = counts["unchanged"] + counts["checkpointed"]
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                break
+        progress.add_stage_time("read", time.monotonic() - started)
+        progress.advance(counts["unchanged"] + counts["checkpointed"] - skipped_before, processed=False)
+        return chunk
+
+    pending_writes = []
+    written = 0
+
+    def flush():
+        nonlocal pending_writes, written
+        started = time.monotonic()
+        write_structured_batch(pending_writes)
+        progress.add_stage_time("write", time.monotonic() - started)
+        checkpoint.mark([item[0] for item in pending_writes])
+        written += len(pending_writes)
+        progress.advance(len(pending_writes))
+        pending_writes = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        in_flight = set()
+        exhausted = False
+        while in_flight or not exhausted:
+            # Keep a couple of chunks queued per worker without reading the whole table
+            while not exhausted and len(in_flight) < workers * 2:
+                chunk = next_chunk()
+                if not chunk:
+                    exhausted = True
+                    break
+                in_flight.add(pool.submit(_extract_chunk, chunk))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, timings = future.result()
+                for stage, seconds in timings.items():
+                    progress.add_stage_time(stage, seconds)
+                pending_writes.extend(results)
+                if len(pending_writes) >= write_batch_size:
+                    flush()
+
+    if pending_writes:
+        flush()
+    progress.report(final=True)
+    print(f"{counts['unchanged']} sessions were already up to date, {counts['checkpointed']} skipped via checkpoint.")
+    checkpoint.clear()
+    return written
@@ -0,0 +1,79 @@
+import json
+import os
+import re
+import threading
+
+# Data-driven entity categorization. Rules live in data/categorization_rules.json
+# and are compiled once: semantic-type rules into a type -> (priority, category)
+# table, keyword rules into one alternation with a named group per rule. A
+# single scan over the mention finds every keyword occurrence and keeps the
+# highest-priority rule among them. Type rules always win over keyword rules,
+# and rule order within each list is priority.
+#
+# Bump "version" in the rules file whenever a change assigns categories
+# differently, so the backfill knows stored results are stale.
+
+RULES_PATH = os.environ.get(
+    "TELEMED_CATEGORIZATION_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "categorization_rules.json")
+)
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+class CategorizationRules:
+    def __init__(self, config):
+        self.version = config["version"]
+        self.default = config["default"]
+
+        self.type_table = {}
+        for priority, rule in enumerate(config["type_rules"]):
+            for semantic_type in rule["types"]:
+                # A type listed by several rules belongs to the first
+                self.type_table.setdefault(semantic_type, (priority, rule["category"]))
+
+        self.keyword_rules = {}
+        branches = []
+        for index, rule in enumerate(config["keyword_rules"]):
+            group = f"rule{index}"
+            self.keyword_rules[group] = (index, rule["category"])
+            keywords = "|".join(re.escape(keyword.lower()) for keyword in rule["keywords"])
+            branches.append(f"(?P<{group}>{keywords})")
+        # Zero-width, so the scan tries every position and keywords that overlap
+        # ("male" inside "female") are all seen, as with substring checks; at
+        # each position the alternation reports the highest-priority rule
+        self.keyword_pattern = re.compile(f"(?=(?:{'|'.join(branches)}))") if branches else None
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def category(self, semantic_types, text) -> str:
+        best = None
+        for semantic_type in semantic_types:
+            match = self.type_table.get(semantic_type)
+            if match is not None and (best is None or match[0] < best[0]):
+                best = match
+        if best is not None:
+            return best[1]
+        if self.keyword_pattern is not None:
+            for match in self.keyword_pattern.finditer(text.lower()):
+                rule = self.keyword_rules[match.lastgroup]
+                if best is None or rule[0] < best[0]:
+                    best = rule
+                    if rule[0] == 0:
+                        break
+            if best is not None:
+                return best[1]
+        return self.default
+
+
+def get_rules():
+    """The process-wide rules, loaded and compiled on first use"""
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                _rules = CategorizationRules.load()
+    return _rules
@@ -0,0 +1,99 @@
+import copy
+import functools
+import os
+import tempfile
+import threading
+import time
+
+# Cached reads expire after this many seconds even without an invalidation, which
+# bounds staleness for writes made from another host.
+DEFAULT_TTL_SECONDS = float(os.environ.get("TELEMED_DB_CACHE_TTL", "30"))
+MAX_ENTRIES = int(os.environ.get("TELEMED_DB_CACHE_MAX_ENTRIES", "512"))
+
+# Writers in other local processes (e.g. the re-extraction script) bump the data
+# version by touching this file; readers compare its mtime on every lookup.
+VERSION_FILE = os.environ.get(
+    "TELEMED_DB_CACHE_VERSION_FILE",
+    os.path.join(tempfile.gettempdir(), "telemed_db_cache.version")
+)
+
+_cache = {}  # key -> (data_version, expires_at, value)
+_local_version = 0
+_lock = threading.Lock()
+_state = threading.local()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _shared_version():
+    try:
+        return os.stat(VERSION_FILE).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def data_version():
+    """Current data version; any write changes it"""
+    return (_local_version, _shared_version())
+
+
+def invalidate():
+    """Drop every cached read; call after writing to the database"""
+    global _local_version
+    with _lock:
+        _local_version += 1
+        _cache.clear()
+        _stats["invalidations"] += 1
+    try:
+        with open(VERSION_FILE, "a"):
+            pass
+        os.utime(VERSION_FILE, None)
+    except OSError as e:
+        print(f"Could not update cache version file {VERSION_FILE}: {e}")
+
+
+def dont_cache_result():
+    """Mark the result of the current cached call (e.g. an error fallback) as not cacheable"""
+    _state.skip = True
+
+
+def cached_query(ttl=None):
+    """Cache a reader's results per arguments until the TTL expires or data changes
+
+    Callers receive deep copies, so mutating a result (as Streamlit code often
+    does with session_state) never alters the cached value.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+            version = data_version()
+            now = time.monotonic()
+
+            with _lock:
+                entry = _cache.get(key)
+                if entry and entry[0] == version and entry[1] > now:
+                    _stats["hits"] += 1
+                    return copy.deepcopy(entry[2])
+                _stats["misses"] += 1
+
+            _state.skip = False
+            value = func(*args, **kwargs)
+            if _state.skip:
+                return value
+
+            expires_at = now + (DEFAULT_TTL_SECONDS if ttl is None else ttl)
+            with _lock:
+                if len(_cache) >= MAX_ENTRIES:
+                    _cache.pop(next(iter(_cache)))
+                _cache[key] = (version, expires_at, copy.deepcopy(value))
+            return value
+        return wrapper
+    return decorator
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters and current size of the read cache"""
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_cache)
+    return stats
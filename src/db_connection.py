@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+
+# Defaults match the local development database. Override them with a JSON file
+# (TELEMED_DB_CONFIG, default ./db_config.json) and/or TELEMED_DB_* variables.
+DEFAULT_DB_CONFIG = {
+    "host": "localhost",
+    "port": 3306,
+    "user": "root",
+    "password": "cyril01",
+    "database": "telemed_db",
+    "auth_plugin": "mysql_native_password",  # the server's default plugin is not supported by the connector
+    "pool_size": 5,
+    "pool_timeout": 10.0,
+}
+
+_ENV_OVERRIDES = {
+    "host": ("TELEMED_DB_HOST", str),
+    "port": ("TELEMED_DB_PORT", int),
+    "user": ("TELEMED_DB_USER", str),
+    "password": ("TELEMED_DB_PASSWORD", str),
+    "database": ("TELEMED_DB_NAME", str),
+    "pool_size": ("TELEMED_DB_POOL_SIZE", int),
+    "pool_timeout": ("TELEMED_DB_POOL_TIMEOUT", float),
+}
+
+_pool = None
+_pool_pid = None
+_pool_config = None
+_pool_lock = threading.Lock()
+_stats = {"checkouts": 0, "in_use": 0, "peak_in_use": 0, "waits": 0, "wait_seconds": 0.0, "timeouts": 0}
+
+
+def load_db_config() -> dict:
+    """Resolve DB settings from defaults, the config file and the environment"""
+    config = dict(DEFAULT_DB_CONFIG)
+
+    config_path = os.environ.get("TELEMED_DB_CONFIG", "db_config.json")
+    if os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+
+    for key, (env_name, cast) in _ENV_OVERRIDES.items():
+        if os.environ.get(env_name):
+            config[key] = cast(os.environ[env_name])
+
+    return config
+
+
+def get_pool():
+    """Return this process's connection pool, creating it on first use"""
+    global _pool, _pool_pid, _pool_config
+    # Pools hold live sockets, so a forked worker must build its own
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                config = load_db_config()
+                connect_args = {k: v for k, v in config.items() if k not in ("pool_size", "pool_timeout")}
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=f"telemed_{os.getpid()}",
+                    pool_size=config["pool_size"],
+                    pool_reset_session=True,
+                    **connect_args
+                )
+                _pool_pid = os.getpid()
+                _pool_config = config
+                for key in _stats:
+                    _stats[key] = 0
+    return _pool
+
+
+def _checkout(timeout):
+    """Take a connection from the pool, waiting up to timeout seconds if it is exhausted"""
+    pool = get_pool()
+    deadline = time.monotonic() + timeout
+    started = None
+    while True:
+        try:
+            connection = pool.get_connection()
+            break
+        except PoolError:
+            if started is None:
+                started = time.monotonic()
+                with _pool_lock:
+                    _stats["waits"] += 1
+            if time.monotonic() >= deadline:
+                with _pool_lock:
+                    _stats["timeouts"] += 1
+                raise
+            time.sleep(0.05)
+
+    with _pool_lock:
+        _stats["checkouts"] += 1
+        _stats["in_use"] += 1
+        _stats["peak_in_use"] = max(_stats["peak_in_use"], _stats["in_use"])
+        if started is not None:
+            _stats["wait_seconds"] += time.monotonic() - started
+    return connection
+
+
+@contextmanager
+def get_connection(timeout=None):
+    """Check out a pooled connection; it is returned to the pool on exit"""
+    get_pool()
+    if timeout is None:
+        timeout = _pool_config["pool_timeout"]
+    connection = _checkout(timeout)
+    try:
+        yield connection
+    except Exception:
+        try:
+            connection.rollback()
+        except mysql.connector.Error:
+            pass
+        raise
+    finally:
+        connection.close()
+        with _pool_lock:
+            _stats["in_use"] -= 1
+
+
+def pool_stats() -> dict:
+    """Snapshot of pool usage counters for this process"""
+    with _pool_lock:
+        stats = dict(_stats)
+    stats["pool_size"] = _pool.pool_size if _pool is not None else 0
+    return stats
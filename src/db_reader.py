@@ -1,64 +1,73 @@
-import mysql.connector
 import json
 from datetime import datetime
+from src.db_cache import cached_query, dont_cache_result
+from src.db_connection import get_connection
+from src.patient_search import escape_like, plan_patient_search
+from src.transcript_search import make_snippet, match_mode, query_terms
 
-def get_db_connection():
-    """Create and return a database connection"""
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="cyril01",
-        database="telemed_db",
-        auth_plugin="mysql_native_password"
-    )
+# Summary rows only need scalar columns; entity counts are computed by the
+# server from the stored JSON arrays so the blobs never leave the database.
+SUMMARY_COLUMNS = """
+    session_id,
+    timestamp,
+    patient_age,
+    patient_gender,
+    COALESCE(JSON_LENGTH(symptoms), 0) AS symptoms_count,
+    COALESCE(JSON_LENGTH(medications), 0) AS medications_count,
+    COALESCE(JSON_LENGTH(procedures), 0) AS procedures_count,
+    COALESCE(JSON_LENGTH(diagnosis), 0) AS diagnosis_count
+"""
 
+@cached_query()
 def get_session_ids():
     """Fetch all distinct session_ids from the consultations table"""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        query = "SELECT DISTINCT session_id FROM consultations ORDER BY session_id"
-        cursor.execute(query)
-        
-        session_ids = [row[0] for row in cursor.fetchall()]
-        
-        cursor.close()
-        connection.close()
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            
+            query = "SELECT DISTINCT session_id FROM consultations ORDER BY session_id"
+            cursor.execute(query)
+            
+            session_ids = [row[0] for row in cursor.fetchall()]
+            
+            cursor.close()
         
         return session_ids
     except Exception as e:
         print(f"Error fetching session IDs: {e}")
+        dont_cache_result()
         return []
 
+@cached_query()
 def get_consultation_by_session(session_id):
     """Fetch consultation data for a specific session_id"""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        query = """
-            SELECT 
-                session_id,
-                timestamp,
-                patient_age,
-                patient_gender,
-                symptoms,
-                medications,
-                procedures,
-                instructions,
-                diagnosis
-            FROM consultations 
-            WHERE session_id = %s
-            ORDER BY timestamp DESC
-            LIMIT 1
-        """
-        
-        cursor.execute(query, (session_id,))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            query = """
+                SELECT 
+                    session_id,
+                    timestamp,
+                    patient_age,
+                    patient_gender,
+                    symptoms,
+                    medications,
+                    procedures,
+                    instructions,
+                    diagnosis,
+                    transcript_hash,
+                    extractor_version
+                FROM consultations 
+                WHERE session_id = %s
+                ORDER BY timestamp DESC
+                LIMIT 1
+            """
+            
+            cursor.execute(query, (session_id,))
+            result = cursor.fetchone()
+            
+            cursor.close()
         
         if result:
             # Convert JSON strings back to lists
@@ -78,38 +87,40 @@ def get_consultation_by_session(session_id):
             return {
                 "session_id": result["session_id"],
                 "timestamp": result["timestamp"],
-                "structured_data": structured_data
+                "structured_data": structured_data,
+                "transcript_hash": result["transcript_hash"],
+                "extractor_version": result["extractor_version"]
             }
         
         return None
         
     except Exception as e:
         print(f"Error fetching consultation data: {e}")
+        dont_cache_result()
         return None
 
+@cached_query()
 def get_consultation_transcript(session_id):
     """Fetch transcript for a specific session_id (if stored separately)"""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        # First, try to check if there's a transcripts table
-        cursor.execute("SHOW TABLES LIKE 'transcripts'")
-        transcripts_table_exists = cursor.fetchone()
-        
-        if transcripts_table_exists:
-            # If transcripts table exists, try to get transcript
-            query = "SELECT transcript FROM transcripts WHERE session_id = %s"
-            cursor.execute(query, (session_id,))
-            result = cursor.fetchone()
+        with get_connection() as connection:
+            cursor = connection.cursor()
             
-            if result:
-                cursor.close()
-                connection.close()
-                return result[0]
-        
-        cursor.close()
-        connection.close()
+            # First, try to check if there's a transcripts table
+            cursor.execute("SHOW TABLES LIKE 'transcripts'")
+            transcripts_table_exists = cursor.fetchone()
+            
+            if transcripts_table_exists:
+                # If transcripts table exists, try to get transcript
+                query = "SELECT transcript FROM transcripts WHERE session_id = %s"
+                cursor.execute(query, (session_id,))
+                result = cursor.fetchone()
+                
+                if result:
+                    cursor.close()
+                    return result[0]
+            
+            cursor.close()
         
         # If no transcript table or no transcript found, try to load from sample file
         try:
@@ -129,109 +140,350 @@ Patient consultation details have been extracted and are available in the medica
         
     except Exception as e:
         print(f"Error fetching transcript: {e}")
+        dont_cache_result()
         return f"""Consultation Transcript for Session {session_id}
 
 [Error loading transcript: {str(e)}]
 
 Please check the database connection and transcript storage configuration."""
 
+@cached_query()
 def get_session_summary(session_id):
     """Get a summary of the session including patient info and entity counts"""
     try:
-        consultation = get_consultation_by_session(session_id)
-        if consultation:
-            data = consultation["structured_data"]
-            return {
-                "session_id": session_id,
-                "timestamp": consultation["timestamp"],
-                "patient_age": data["patient_info"]["age"],
-                "patient_gender": data["patient_info"]["gender"],
-                "symptoms_count": len(data["symptoms"]),
-                "medications_count": len(data["medications"]),
-                "procedures_count": len(data["procedures"]),
-                "diagnosis_count": len(data["diagnosis"])
-            }
-        return None
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            query = f"""
+                SELECT {SUMMARY_COLUMNS}
+                FROM consultations 
+                WHERE session_id = %s
+                ORDER BY timestamp DESC
+                LIMIT 1
+            """
+            
+            cursor.execute(query, (session_id,))
+            result = cursor.fetchone()
+            
+            cursor.close()
+        
+        return result
     except Exception as e:
         print(f"Error getting session summary: {e}")
+        dont_cache_result()
         return None
 
-def search_sessions_by_patient(patient_search):
-    """Search sessions by patient information (age, gender, or session_id)"""
+@cached_query()
+def search_sessions_by_patient(patient_search, limit=50):
+    """Search sessions by patient information (age, age range, gender, or session_id prefix)"""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        # Search in session_id, patient_age, or patient_gender
-        query = """
-            SELECT DISTINCT session_id, timestamp, patient_age, patient_gender
-            FROM consultations 
-            WHERE session_id LIKE %s 
-               OR patient_age LIKE %s 
-               OR patient_gender LIKE %s
-            ORDER BY timestamp DESC
-        """
-        
-        search_term = f"%{patient_search}%"
-        cursor.execute(query, (search_term, search_term, search_term))
-        results = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
+        where, params = plan_patient_search(patient_search)
+        if not where:
+            return []
+        
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            # The planner only emits conditions on indexed columns
+            query = f"""
+                SELECT session_id, timestamp, patient_age, patient_gender
+                FROM consultations 
+                WHERE {where}
+                ORDER BY timestamp DESC
+                LIMIT %s
+            """
+            
+            cursor.execute(query, (*params, limit))
+            results = cursor.fetchall()
+            
+            cursor.close()
         
         return results
         
     except Exception as e:
         print(f"Error searching sessions: {e}")
+        dont_cache_result()
         return []
 
+@cached_query()
 def get_all_session_summaries():
     """Get summaries of all sessions for search functionality"""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        query = """
-            SELECT 
-                session_id,
-                timestamp,
-                patient_age,
-                patient_gender,
-                symptoms,
-                medications,
-                procedures,
-                diagnosis
-            FROM consultations 
-            ORDER BY timestamp DESC
-        """
-        
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        summaries = []
-        for result in results:
-            # Count entities
-            symptoms_count = len(json.loads(result["symptoms"])) if result["symptoms"] else 0
-            medications_count = len(json.loads(result["medications"])) if result["medications"] else 0
-            procedures_count = len(json.loads(result["procedures"])) if result["procedures"] else 0
-            diagnosis_count = len(json.loads(result["diagnosis"])) if result["diagnosis"] else 0
-            
-            summaries.append({
-                "session_id": result["session_id"],
-                "timestamp": result["timestamp"],
-                "patient_age": result["patient_age"],
-                "patient_gender": result["patient_gender"],
-                "symptoms_count": symptoms_count,
-                "medications_count": medications_count,
-                "procedures_count": procedures_count,
-                "diagnosis_count": diagnosis_count
-            })
-        
-        cursor.close()
-        connection.close()
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            query = f"""
+                SELECT {SUMMARY_COLUMNS}
+                FROM consultations 
+                ORDER BY timestamp DESC
+            """
+            
+            cursor.execute(query)
+            summaries = cursor.fetchall()
+            cursor.close()
         
         return summaries
         
     except Exception as e:
         print(f"Error getting session summaries: {e}")
-        return [] 
\ No newline at end of file
+        dont_cache_result()
+        return []
+
+@cached_query()
+def get_session_ids_page(after=None, limit=50, prefix=None):
+    """Fetch one page of session_ids in ascending order (keyset pagination)
+
+    after is the last session_id of the previous page; prefix restricts the
+    page to session_ids starting with it (index-friendly LIKE 'prefix%').
+    """
+    try:
+        conditions = []
+        params = []
+        if after is not None:
+            conditions.append("session_id > %s")
+            params.append(after)
+        if prefix:
+            conditions.append("session_id LIKE %s")
+            params.append(escape_like(prefix) + "%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            
+            query = f"""
+                SELECT DISTINCT session_id
+                FROM consultations
+                {where}
+                ORDER BY session_id
+                LIMIT %s
+            """
+            
+            cursor.execute(query, (*params, limit))
+            session_ids = [row[0] for row in cursor.fetchall()]
+            
+            cursor.close()
+        
+        return session_ids
+    except Exception as e:
+        print(f"Error fetching session ID page: {e}")
+        dont_cache_result()
+        return []
+
+@cached_query()
+def get_session_summaries_page(after=None, limit=20):
+    """Fetch one page of session summaries, newest first (keyset pagination)
+
+    after is the (timestamp, session_id) of the last row of the previous page.
+    """
+    try:
+        where = ""
+        params = []
+        if after is not None:
+            after_timestamp, after_session_id = after
+            where = "WHERE timestamp < %s OR (timestamp = %s AND session_id < %s)"
+            params = [after_timestamp, after_timestamp, after_session_id]
+        
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            query = f"""
+                SELECT {SUMMARY_COLUMNS}
+                FROM consultations
+                {where}
+                ORDER BY timestamp DESC, session_id DESC
+                LIMIT %s
+            """
+            
+            cursor.execute(query, (*params, limit))
+            summaries = cursor.fetchall()
+            
+            cursor.close()
+        
+        return summaries
+    except Exception as e:
+        print(f"Error fetching session summary page: {e}")
+        dont_cache_result()
+        return []
+
+@cached_query()
+def search_transcripts(query, limit=20):
+    """Full-text search over stored transcripts, best matches first, with highlighted snippets"""
+    try:
+        if not query.strip():
+            return []
+        mode = match_mode(query)
+        
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            # Served by the ft_transcripts_transcript FULLTEXT index
+            sql = f"""
+                SELECT session_id, transcript, created_at,
+                       MATCH(transcript) AGAINST (%s {mode}) AS score
+                FROM transcripts
+                WHERE MATCH(transcript) AGAINST (%s {mode})
+                ORDER BY score DESC
+                LIMIT %s
+            """
+            
+            cursor.execute(sql, (query, query, limit))
+            rows = cursor.fetchall()
+            
+            cursor.close()
+        
+        terms = query_terms(query)
+        return [
+            {
+                "session_id": row["session_id"],
+                "created_at": row["created_at"],
+                "score": float(row["score"]),
+                "snippet": make_snippet(row["transcript"], terms)
+            }
+            for row in rows
+        ]
+    except Exception as e:
+        print(f"Error searching transcripts: {e}")
+        dont_cache_result()
+        return []
+
+def page_cursor(summary):
+    """Keyset cursor for the row after which the next summaries page starts"""
+    return (summary["timestamp"], summary["session_id"])
+
+@cached_query()
+def get_sessions_by_entity(cui=None, text=None, category=None, limit=50):
+    """Find sessions mentioning an entity, by UMLS CUI or by text/canonical name, optionally within one category"""
+    try:
+        conditions = []
+        params = []
+        if cui:
+            conditions.append("umls_cui = %s")
+            params.append(cui)
+        if text:
+            conditions.append("(text = %s OR canonical_name = %s)")
+            params.extend([text, text])
+        if category:
+            conditions.append("category = %s")
+            params.append(category)
+        if not conditions:
+            return []
+        
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            query = f"""
+                SELECT session_id, COUNT(*) AS mentions,
+                       GROUP_CONCAT(DISTINCT category ORDER BY category) AS categories
+                FROM consultation_entities
+                WHERE {' AND '.join(conditions)}
+                GROUP BY session_id
+                ORDER BY mentions DESC, session_id
+                LIMIT %s
+            """
+            
+            cursor.execute(query, (*params, limit))
+            results = cursor.fetchall()
+            
+            cursor.close()
+        
+        return results
+    except Exception as e:
+        print(f"Error looking up sessions by entity: {e}")
+        dont_cache_result()
+        return []
+
+@cached_query()
+def get_session_entities(session_id):
+    """Fetch the normalized entities of a session, including UMLS CUIs and canonical names"""
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            query = """
+                SELECT category, text, umls_cui, canonical_name
+                FROM consultation_entities
+                WHERE session_id = %s
+                ORDER BY id
+            """
+            
+            cursor.execute(query, (session_id,))
+            results = cursor.fetchall()
+            
+            cursor.close()
+        
+        return results
+    except Exception as e:
+        print(f"Error fetching session entities: {e}")
+        dont_cache_result()
+        return []
+
+def iter_backfill_rows(page_size=1000):
+    """Stream every session that has a stored transcript, with its latest patient info
+
+    One joined query per page of page_size sessions replaces the per-session
+    transcript and consultation lookups. Yields dicts with session_id,
+    transcript, patient_info, and the transcript_hash / extractor_version the
+    stored entities were produced from, ordered by session_id.
+    """
+    last_session_id = ""
+    while True:
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            
+            # The derived table pages over transcripts (one row per session);
+            # the join brings in every consultation row of those sessions.
+            # LEFT JOIN keeps transcript-only sessions so the page end is known.
+            query = """
+                SELECT t.session_id, t.transcript, c.timestamp, c.patient_age, c.patient_gender,
+                       c.transcript_hash, c.extractor_version
+                FROM (
+                    SELECT session_id, transcript
+                    FROM transcripts
+                    WHERE session_id > %s
+                    ORDER BY session_id
+                    LIMIT %s
+                ) t
+                LEFT JOIN consultations c ON c.session_id = t.session_id
+                ORDER BY t.session_id, c.timestamp DESC
+            """
+            
+            cursor.execute(query, (last_session_id, page_size))
+            rows = cursor.fetchall()
+            
+            cursor.close()
+        
+        if not rows:
+            return
+        
+        seen = set()
+        for row in rows:
+            # Rows are newest first within a session; keep the latest only
+            if row["session_id"] in seen or row["timestamp"] is None:
+                continue
+            seen.add(row["session_id"])
+            yield {
+                "session_id": row["session_id"],
+                "transcript": row["transcript"],
+                "patient_info": {"age": row["patient_age"], "gender": row["patient_gender"]},
+                "transcript_hash": row["transcript_hash"],
+                "extractor_version": row["extractor_version"]
+            }
+        last_session_id = rows[-1]["session_id"]
+
+def count_backfill_sessions():
+    """Number of sessions iter_backfill_rows will visit: a stored transcript and a consultation row"""
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            query = """
+                SELECT COUNT(*)
+                FROM transcripts t
+                WHERE EXISTS (SELECT 1 FROM consultations c WHERE c.session_id = t.session_id)
+            """
+            cursor.execute(query)
+            count = cursor.fetchone()[0]
+            cursor.close()
+        return count
+    except Exception as e:
+        print(f"Error counting backfill sessions: {e}")
+        return 0
@@ -0,0 +1,162 @@
+from src.db_connection import get_connection
+from src.patient_search import parse_age, parse_gender
+
+# Tables created on demand, in creation order: (table, DDL)
+TABLES = [
+    ("transcripts", """
+        CREATE TABLE IF NOT EXISTS transcripts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id VARCHAR(50) NOT NULL,
+            transcript TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_session_transcript (session_id),
+            FULLTEXT KEY ft_transcripts_transcript (transcript)
+        )
+    """),
+    ("consultation_entities", """
+        CREATE TABLE IF NOT EXISTS consultation_entities (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            session_id VARCHAR(50) NOT NULL,
+            category VARCHAR(20) NOT NULL,
+            text VARCHAR(255) NOT NULL,
+            umls_cui CHAR(8) NULL,
+            canonical_name VARCHAR(255) NULL,
+            KEY idx_entities_session (session_id),
+            KEY idx_entities_cui (umls_cui, session_id),
+            KEY idx_entities_category (category, session_id),
+            KEY idx_entities_text (text),
+            KEY idx_entities_canonical (canonical_name)
+        )
+    """),
+]
+
+# Columns added after the consultations table was first created:
+# (table, column name, column definition)
+COLUMNS = [
+    ("consultations", "patient_age_years", "SMALLINT UNSIGNED NULL"),
+    ("consultations", "patient_gender_code", "ENUM('female', 'male', 'other') NULL"),
+    ("consultations", "transcript_hash", "CHAR(64) NULL"),
+    ("consultations", "extractor_version", "VARCHAR(255) NULL"),
+]
+
+# Secondary indexes the read paths depend on: (table, index name, column list,
+# index kind). They are created on demand because the tables predate them.
+INDEXES = [
+    ("consultations", "idx_consultations_session", "session_id", ""),
+    ("consultations", "idx_consultations_recent", "timestamp, session_id", ""),
+    ("consultations", "idx_consultations_age", "patient_age_years, timestamp", ""),
+    ("consultations", "idx_consultations_gender", "patient_gender_code, timestamp", ""),
+    ("transcripts", "ft_transcripts_transcript", "transcript", "FULLTEXT"),
+]
+
+NORMALIZE_BATCH_SIZE = 1000
+
+_schema_checked = False
+
+
+def _index_exists(cursor, table, index_name):
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """,
+        (table, index_name)
+    )
+    return cursor.fetchone() is not None
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+        """,
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+
+def normalize_patient_fields(connection):
+    """Fill patient_age_years / patient_gender_code for rows that only have free text"""
+    cursor = connection.cursor(buffered=True)
+    updated = 0
+    # Keyset over (session_id, timestamp): rows whose text cannot be parsed keep
+    # NULLs, so the scan must advance past them rather than re-select them.
+    last_id, last_timestamp = "", None
+    while True:
+        cursor.execute(
+            """
+            SELECT session_id, timestamp, patient_age, patient_gender
+            FROM consultations
+            WHERE (session_id > %s OR (session_id = %s AND timestamp > %s))
+              AND ((patient_age IS NOT NULL AND patient_age_years IS NULL)
+                OR (patient_gender IS NOT NULL AND patient_gender_code IS NULL))
+            ORDER BY session_id, timestamp
+            LIMIT %s
+            """,
+            (last_id, last_id, last_timestamp or "1000-01-01", NORMALIZE_BATCH_SIZE)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            """
+            UPDATE consultations SET patient_age_years = %s, patient_gender_code = %s
+            WHERE session_id = %s AND timestamp = %s
+            """,
+            [(parse_age(age), parse_gender(gender), session_id, timestamp)
+             for session_id, timestamp, age, gender in rows]
+        )
+        connection.commit()
+        updated += len(rows)
+        last_id, last_timestamp = rows[-1][0], rows[-1][1]
+    cursor.close()
+    return updated
+
+
+def ensure_schema(force=False):
+    """Add any missing tables, columns and indexes; runs once per process unless forced"""
+    global _schema_checked
+    if _schema_checked and not force:
+        return
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor(buffered=True)
+            for table, ddl in TABLES:
+                cursor.execute(ddl)
+            added_columns = False
+            for table, column, definition in COLUMNS:
+                if not _column_exists(cursor, table, column):
+                    print(f"Adding column {table}.{column}")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                    added_columns = True
+            for table, index_name, columns, kind in INDEXES:
+                if not _index_exists(cursor, table, index_name):
+                    print(f"Creating {kind or 'BTREE'} index {index_name} on {table}({columns})")
+                    cursor.execute(f"CREATE {kind} INDEX {index_name} ON {table} ({columns})")
+            connection.commit()
+            cursor.close()
+            # Rows whose text cannot be parsed stay NULL for good, so a check for
+            # pending rows would rescan them on every start. Rows missed by an
+            # interrupted pass are picked up with `python -m src.db_schema --normalize-patients`.
+            if added_columns:
+                print(f"Normalized patient fields for {normalize_patient_fields(connection)} rows")
+        _schema_checked = True
+    except Exception as e:
+        print(f"Error ensuring database schema: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create missing tables, columns and indexes")
+    parser.add_argument("--normalize-patients", action="store_true",
+                        help="Also fill patient_age_years / patient_gender_code for rows that lack them")
+    args = parser.parse_args()
+
+    ensure_schema(force=True)
+    if args.normalize_patients:
+        with get_connection() as connection:
+            print(f"Normalized patient fields for {normalize_patient_fields(connection)} rows")
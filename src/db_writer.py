@@ -1,86 +1,224 @@
-import mysql.connector
 import json
 from datetime import datetime
+from src.db_cache import invalidate
+from src.db_connection import get_connection
+from src.db_schema import ensure_schema
+from src.entity_extractor import categorize_entity_records, extractor_version, transcript_hash
+from src.patient_search import parse_age, parse_gender
 
-def store_consultation(data, session_id="consult_001"):
-    connection = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="cyril01",
-    database="telemed_db",
-    auth_plugin="mysql_native_password"  # this is to explicitly tell the connector to use that plugin to asvoid the issue of not supporting the current module 
-)
+ENTITY_TEXT_MAX_LENGTH = 255
 
-    cursor = connection.cursor()
+def _truncate(value):
+    return value[:ENTITY_TEXT_MAX_LENGTH] if value else value
+
+def _replace_entities(cursor, session_entities):
+    """Rewrite the normalized consultation_entities rows of each (session_id, entities) pair"""
+    if not session_entities:
+        return
+    placeholders = ", ".join(["%s"] * len(session_entities))
+    cursor.execute(
+        f"DELETE FROM consultation_entities WHERE session_id IN ({placeholders})",
+        [session_id for session_id, _ in session_entities]
+    )
+    rows = [
+        (session_id, record["category"], _truncate(record["text"]), record["umls_cui"], _truncate(record["canonical_name"]))
+        for session_id, entities in session_entities
+        for record in categorize_entity_records(entities)
+    ]
+    if rows:
+        cursor.executemany(
+            """
+            INSERT INTO consultation_entities (session_id, category, text, umls_cui, canonical_name)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            rows
+        )
 
+def store_consultation(data, session_id="consult_001", entities=None, transcript=None, mark_current=True):
+    """Store categorized consultation data; pass the raw extract_entities output
+    as entities to also populate consultation_entities, and the source transcript
+    to record its hash and the extractor version for incremental re-extraction.
+    mark_current=False records neither, so the backfill re-extracts the session
+    with the full pipeline (used for fast-mode results)"""
+    ensure_schema()
     query = """
         INSERT INTO consultations (
             session_id, timestamp,
-            patient_age, patient_gender,
-            symptoms, medications, procedures, instructions, diagnosis
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            patient_age, patient_gender, patient_age_years, patient_gender_code,
+            symptoms, medications, procedures, instructions, diagnosis,
+            transcript_hash, extractor_version
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
 
-    values = (
-        session_id,
-        datetime.utcnow(),
-        data["patient_info"]["age"],
-        data["patient_info"]["gender"],
-        json.dumps(data.get("symptoms", [])),
-        json.dumps(data.get("medications", [])),
-        json.dumps(data.get("procedures", [])),
-        json.dumps(data.get("instructions", [])),
-        json.dumps(data.get("diagnosis", [])),
-    )
+    source_hash = transcript_hash(transcript) if transcript is not None and mark_current else None
+    values = (session_id, datetime.utcnow(), *_structured_values(data, source_hash))
 
-    cursor.execute(query, values)
-    connection.commit()
-    cursor.close()
-    connection.close()
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(query, values)
+        if entities is not None:
+            _replace_entities(cursor, [(session_id, entities)])
+        connection.commit()
+        cursor.close()
+    invalidate()
 
 def store_transcript(session_id, transcript_text):
     """Store transcript text in the database"""
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="cyril01",
-        database="telemed_db",
-        auth_plugin="mysql_native_password"
-    )
+    # Creates the transcripts table (with its FULLTEXT index) if it doesn't exist
+    ensure_schema()
+    with get_connection() as connection:
+        cursor = connection.cursor()
 
-    cursor = connection.cursor()
+        # Insert or update transcript
+        query = """
+            INSERT INTO transcripts (session_id, transcript)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE
+                transcript = VALUES(transcript),
+                created_at = CURRENT_TIMESTAMP
+        """
 
-    # First, create transcripts table if it doesn't exist
-    create_table_query = """
-        CREATE TABLE IF NOT EXISTS transcripts (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            session_id VARCHAR(50) NOT NULL,
-            transcript TEXT NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE KEY unique_session_transcript (session_id)
-        )
+        values = (session_id, transcript_text)
+        cursor.execute(query, values)
+        connection.commit()
+        cursor.close()
+    invalidate()
+
+def _structured_values(structured_data, source_hash=None):
+    """Column values for the structured_data fields, in UPDATE column order
+
+    The last two are the transcript hash and extractor version; both are NULL
+    when the data was not extracted from a known transcript.
     """
-    cursor.execute(create_table_query)
+    return (
+        structured_data["patient_info"]["age"],
+        structured_data["patient_info"]["gender"],
+        parse_age(structured_data["patient_info"]["age"]),
+        parse_gender(structured_data["patient_info"]["gender"]),
+        json.dumps(structured_data.get("symptoms", [])),
+        json.dumps(structured_data.get("medications", [])),
+        json.dumps(structured_data.get("procedures", [])),
+        json.dumps(structured_data.get("instructions", [])),
+        json.dumps(structured_data.get("diagnosis", [])),
+        source_hash,
+        extractor_version() if source_hash else None,
+    )
 
-    # Insert or update transcript
+def update_structured_data(session_id, structured_data, entities=None, source_hash=None):
+    """Update the structured_data fields in the consultations table for a session.
+    Passing the raw extract_entities output as entities also rewrites consultation_entities,
+    and passing the source transcript's transcript_hash() records it with the extractor version."""
+    ensure_schema()
     query = """
-        INSERT INTO transcripts (session_id, transcript) 
-        VALUES (%s, %s)
-        ON DUPLICATE KEY UPDATE 
-            transcript = VALUES(transcript),
-            created_at = CURRENT_TIMESTAMP
+        UPDATE consultations SET
+            patient_age = %s,
+            patient_gender = %s,
+            patient_age_years = %s,
+            patient_gender_code = %s,
+            symptoms = %s,
+            medications = %s,
+            procedures = %s,
+            instructions = %s,
+            diagnosis = %s,
+            transcript_hash = %s,
+            extractor_version = %s
+        WHERE session_id = %s
     """
+    values = (*_structured_values(structured_data, source_hash), session_id)
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(query, values)
+        if entities is not None:
+            _replace_entities(cursor, [(session_id, entities)])
+        connection.commit()
+        cursor.close()
+    invalidate()
+
+def _flush_structured_updates(connection, batch):
+    """Apply one batch of (session_id, structured_data, entities, transcript_hash) in a single transaction"""
+    # Last write wins if a session appears twice in the batch
+    batch = list({item[0]: item for item in batch}.values())
+    cursor = connection.cursor()
+    # Stage the rows with one multi-row INSERT, then apply them with one joined
+    # UPDATE; executemany on UPDATE would still cost a round trip per row.
+    cursor.execute("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS structured_data_updates (
+            session_id VARCHAR(50) NOT NULL PRIMARY KEY,
+            patient_age VARCHAR(255) NULL,
+            patient_gender VARCHAR(255) NULL,
+            patient_age_years SMALLINT UNSIGNED NULL,
+            patient_gender_code ENUM('female', 'male', 'other') NULL,
+            symptoms TEXT, medications TEXT, procedures TEXT, instructions TEXT, diagnosis TEXT,
+            transcript_hash CHAR(64) NULL,
+            extractor_version VARCHAR(255) NULL
+        )
+    """)
+    cursor.execute("DELETE FROM structured_data_updates")
+    cursor.executemany(
+        """
+        INSERT INTO structured_data_updates (
+            session_id, patient_age, patient_gender, patient_age_years, patient_gender_code,
+            symptoms, medications, procedures, instructions, diagnosis,
+            transcript_hash, extractor_version
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        [(session_id, *_structured_values(structured_data, source_hash)) for session_id, structured_data, _, source_hash in batch]
+    )
+    cursor.execute("""
+        UPDATE consultations c
+        JOIN structured_data_updates u ON u.session_id = c.session_id
+        SET c.patient_age = u.patient_age,
+            c.patient_gender = u.patient_gender,
+            c.patient_age_years = u.patient_age_years,
+            c.patient_gender_code = u.patient_gender_code,
+            c.symptoms = u.symptoms,
+            c.medications = u.medications,
+            c.procedures = u.procedures,
+            c.instructions = u.instructions,
+            c.diagnosis = u.diagnosis,
+            c.transcript_hash = u.transcript_hash,
+            c.extractor_version = u.extractor_version
+    """)
 
-    values = (session_id, transcript_text)
-    cursor.execute(query, values)
+    _replace_entities(cursor, [(session_id, entities) for session_id, _, entities, _ in batch if entities is not None])
     connection.commit()
     cursor.close()
-    connection.close()
 
-def store_consultation_with_transcript(data, transcript_text, session_id="consult_001"):
+def write_structured_batch(batch):
+    """Commit one batch of (session_id, structured_data, entities, transcript_hash) items as a single transaction"""
+    ensure_schema()
+    with get_connection() as connection:
+        _flush_structured_updates(connection, batch)
+    invalidate()
+
+def bulk_update_structured_data(items, batch_size=500, on_flush=None):
+    """Write (session_id, structured_data, entities, transcript_hash) items in batch_size transactions
+
+    items may be a generator; it is consumed lazily so extraction and writing
+    overlap. on_flush(session_ids) is called after each committed batch.
+    Returns the number of sessions written.
+    """
+    written = 0
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            write_structured_batch(batch)
+            written += len(batch)
+            if on_flush:
+                on_flush([item[0] for item in batch])
+            batch = []
+    if batch:
+        write_structured_batch(batch)
+        written += len(batch)
+        if on_flush:
+            on_flush([item[0] for item in batch])
+    return written
+
+def store_consultation_with_transcript(data, transcript_text, session_id="consult_001", entities=None, mark_current=True):
     """Store both consultation data and transcript"""
     # Store consultation data
-    store_consultation(data, session_id)
-    
+    store_consultation(data, session_id, entities=entities, transcript=transcript_text, mark_current=mark_current)
+
     # Store transcript
     store_transcript(session_id, transcript_text)
\ No newline at end of file
@@ -1,15 +1,119 @@
-def extract_entities(text: str) -> list:
+import functools
+import hashlib
+import os
+import threading
+from importlib import metadata
+
+from src.categorizer import get_rules
+from src.gazetteer import get_gazetteer
+from src.model_client import ModelServerUnavailable, remote_extract, server_available
+from src.span_cache import CACHE_PATH as SPAN_CACHE_PATH, CachedLinker, SpanConceptCache
+from src.umls_table import get_table, lookup_concept
+
+SCISPACY_MODEL = "en_core_sci_sm"
+LINKER_CONFIG = {"resolve_abbreviations": True, "name": "umls"}
+
+# "full" runs scispaCy NER and the UMLS linker; "fast" matches the curated
+# gazetteer (src/gazetteer.py) and, per FAST_FALLBACK, links only what it missed
+EXTRACTION_MODES = ("full", "fast")
+# "none": gazetteer hits only; "unmatched": also link NER spans no gazetteer hit covers
+FAST_FALLBACK_POLICIES = ("none", "unmatched")
+FAST_FALLBACK = os.environ.get("TELEMED_FAST_FALLBACK", "unmatched")
+
+_pipeline = None  # (nlp, linker), built lazily by get_pipeline()
+_pipeline_lock = threading.Lock()
+_span_cache = None  # SpanConceptCache in front of the linker, unless TELEMED_SPAN_CACHE is empty
+
+
+def _build_pipeline():
     import spacy
-    nlp = spacy.load("en_core_sci_sm")
-    # Add the UMLS EntityLinker if not already present
+    nlp = spacy.load(SCISPACY_MODEL)
+    global _span_cache
+    if SPAN_CACHE_PATH:
+        _span_cache = SpanConceptCache(SPAN_CACHE_PATH, linker_version=linker_version())
+    # Add the UMLS EntityLinker if not already present, behind the span cache
     if not nlp.has_pipe("scispacy_linker"):
         import scispacy
         from scispacy.umls_linking import UmlsEntityLinker
-        linker = UmlsEntityLinker(resolve_abbreviations=True, name="umls")
-        nlp.add_pipe(linker)
+        linker = UmlsEntityLinker(**LINKER_CONFIG)
+        nlp.add_pipe(CachedLinker(linker, _span_cache) if _span_cache else linker)
     else:
         linker = nlp.get_pipe("scispacy_linker")
-    doc = nlp(text)
+        if _span_cache:
+            nlp.replace_pipe("scispacy_linker", CachedLinker(linker, _span_cache))
+    _release_concept_dict(linker)
+    return nlp, linker
+
+
+def span_cache_stats():
+    """Hit/miss counts of the span concept cache in this process (None if disabled or not loaded)"""
+    return _span_cache.stats() if _span_cache else None
+
+
+def _release_concept_dict(linker):
+    """Serve the KB's cui -> concept lookups from the memory-mapped compact table
+
+    The linker still needs the KB's aliases for candidate generation, but its
+    per-concept records are replaced by the shared table so the dict can be freed.
+    """
+    table = get_table()
+    kb = getattr(linker, "umls", None) or getattr(linker, "kb", None)
+    if table is None or kb is None:
+        return
+    kb.cui_to_entity = table
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "missing"
+
+
+@functools.lru_cache(maxsize=None)
+def linker_version() -> str:
+    """Identify the model, scispaCy release (and so its KB) and linker config"""
+    linker = ",".join(f"{k}={v}" for k, v in sorted(LINKER_CONFIG.items()))
+    return (
+        f"{SCISPACY_MODEL}=={_package_version(SCISPACY_MODEL)};"
+        f"scispacy=={_package_version('scispacy')};"
+        f"linker[{linker}]"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def extractor_version() -> str:
+    """Identify the model, linker config and rules that produce stored entities"""
+    return f"{linker_version()};rules=={get_rules().version}"
+
+
+def transcript_hash(text: str) -> str:
+    """Content hash of the transcript entities were extracted from"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_pipeline():
+    """Return the process-wide (nlp, linker) pair, building it on first use"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            # Re-check under the lock so concurrent first callers load the KB once
+            if _pipeline is None:
+                _pipeline = _build_pipeline()
+    return _pipeline
+
+
+def get_nlp():
+    """Return the shared scispaCy pipeline"""
+    return get_pipeline()[0]
+
+
+def get_linker():
+    """Return the shared UMLS linker attached to the pipeline"""
+    return get_pipeline()[1]
+
+
+def _doc_to_entities(doc, linker) -> list:
     entities = []
     for ent in doc.ents:
         # Get UMLS concepts and semantic types
@@ -17,7 +121,7 @@ def extract_entities(text: str) -> list:
         if umls_ents:
             # Take the top candidate
             concept_id, score = umls_ents[0]
-            concept = linker.umls.cui_to_entity[concept_id]
+            concept = lookup_concept(concept_id, linker.umls)
             semantic_types = concept.types  # List of semantic type codes
             entities.append({
                 "text": ent.text,
@@ -35,44 +139,161 @@ def extract_entities(text: str) -> list:
     return entities
 
 
+def _extract_texts(texts: list) -> list:
+    """Entity lists for a list of texts, from the model server when one is running"""
+    if server_available():
+        try:
+            return remote_extract(texts)
+        except ModelServerUnavailable:
+            pass  # Server went away since the last ping; extract locally
+    nlp, linker = get_pipeline()
+    return [_doc_to_entities(doc, linker) for doc in nlp.pipe(texts)]
+
+
+def extract_entities(text: str, mode="full") -> list:
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode {mode!r}, expected one of {EXTRACTION_MODES}")
+    if mode == "fast":
+        return extract_entities_fast(text)
+    if server_available():
+        return _extract_texts([text])[0]
+    nlp, linker = get_pipeline()
+    return _doc_to_entities(nlp(text), linker)
+
+
+def extract_entities_fast(text: str, fallback=FAST_FALLBACK) -> list:
+    """Gazetteer extraction, same entity dicts as extract_entities, in text order
+
+    With fallback="unmatched" the NER model still runs, and the UMLS linker is
+    applied only to NER spans that no gazetteer hit overlaps. That runs on the
+    model server when one is up, so this process never loads the pipeline.
+    """
+    if fallback not in FAST_FALLBACK_POLICIES:
+        raise ValueError(f"Unknown fallback policy {fallback!r}, expected one of {FAST_FALLBACK_POLICIES}")
+    if fallback != "none" and server_available():
+        # The fallback needs the NER model and linker, which the server already holds
+        try:
+            return remote_extract([text], mode="fast", fallback=fallback)[0]
+        except ModelServerUnavailable:
+            pass  # Server went away since the last ping; extract locally
+    matches = get_gazetteer().match(text)
+    if fallback == "none":
+        return [entity for _, _, entity in matches]
+
+    nlp, linker = get_pipeline()
+    link = nlp.get_pipe("scispacy_linker")  # the span-cached linker when enabled
+    with nlp.disable_pipes("scispacy_linker"):
+        doc = nlp(text)
+    unmatched = [
+        ent for ent in doc.ents
+        if all(ent.end_char <= start or ent.start_char >= end for start, end, _ in matches)
+    ]
+    linked = []
+    if unmatched:
+        doc.ents = unmatched
+        link(doc)
+        linked = [
+            (ent.start_char, ent.end_char, entity)
+            for ent, entity in zip(doc.ents, _doc_to_entities(doc, linker))
+        ]
+    return [entity for _, _, entity in sorted(matches + linked, key=lambda m: m[0])]
+
+
+def _extract_batch_remote(texts, batch_size, as_tuples):
+    batch = []
+    for item in texts:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield from _yield_batch(batch, as_tuples)
+            batch = []
+    if batch:
+        yield from _yield_batch(batch, as_tuples)
+
+
+def _yield_batch(batch, as_tuples):
+    if as_tuples:
+        results = _extract_texts([text for text, _ in batch])
+        yield from zip(results, [context for _, context in batch])
+    else:
+        yield from _extract_texts(batch)
+
+
+def extract_entities_batch(texts, batch_size=16, n_process=1, as_tuples=False):
+    """Stream entity lists for many texts, in input order, using nlp.pipe
+
+    With as_tuples=True, texts is an iterable of (text, context) pairs and
+    (entities, context) pairs are yielded, so callers can carry ids through.
+    n_process > 1 forks worker processes that share the loaded pipeline.
+    With a model server running, batches are sent there and n_process is unused.
+    """
+    if server_available():
+        yield from _extract_batch_remote(texts, batch_size, as_tuples)
+        return
+    nlp, linker = get_pipeline()
+    docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process, as_tuples=as_tuples)
+    if as_tuples:
+        for doc, context in docs:
+            yield _doc_to_entities(doc, linker), context
+    else:
+        for doc in docs:
+            yield _doc_to_entities(doc, linker)
+
+
+# Entity categories that are lists of mentions (patient_info holds single values)
+ENTITY_CATEGORIES = ["symptoms", "medications", "procedures", "instructions", "diagnosis", "other"]
+
+
+def entity_category(ent: dict) -> str:
+    """Category for one extracted entity: one of ENTITY_CATEGORIES, or "age" / "gender" for patient info"""
+    return get_rules().category(ent["semantic_types"], ent["text"])
+
+
 def categorize_entities(entities: list) -> dict:
-    # UMLS semantic type codes for each category
-    SYMPTOM_TYPES = {"T184"}  # Sign or Symptom
-    MEDICATION_TYPES = {"T121", "T200"}  # Pharmacologic Substance, Clinical Drug
-    PROCEDURE_TYPES = {"T061"}  # Therapeutic or Preventive Procedure
-    DIAGNOSIS_TYPES = {"T047"}  # Disease or Syndrome
-
-    categorized = {
-        "patient_info": {"age": None, "gender": None},
-        "symptoms": [],
-        "medications": [],
-        "procedures": [],
-        "instructions": [],
-        "diagnosis": [],
-        "other": []
-    }
+    return categorize_entities_batch([entities])[0]
 
-    for ent in entities:
-        text = ent["text"]
-        types = set(ent["semantic_types"])
-        token = text.lower()
-
-        if SYMPTOM_TYPES & types:
-            categorized["symptoms"].append(text)
-        elif MEDICATION_TYPES & types:
-            categorized["medications"].append(text)
-        elif PROCEDURE_TYPES & types:
-            categorized["procedures"].append(text)
-        elif DIAGNOSIS_TYPES & types:
-            categorized["diagnosis"].append(text)
-        # Instructions: still use keywords (no good UMLS type)
-        elif any(inst in token for inst in ["rest", "follow up", "monitoring", "advised", "hydrated", "take", "prescribed"]):
-            categorized["instructions"].append(text)
-        elif "year-old" in token:
-            categorized["patient_info"]["age"] = token
-        elif "female" in token or "male" in token:
-            categorized["patient_info"]["gender"] = token
-        else:
-            categorized["other"].append(text)
 
-    return categorized
\ No newline at end of file
+def categorize_entities_batch(entity_lists) -> list:
+    """categorize_entities for many entity lists at once
+
+    A mention (text and semantic types) repeated anywhere in the batch is
+    classified only once, so pass sessions in chunks rather than all at once.
+    """
+    rules = get_rules()
+    categories = {}
+    results = []
+    for entities in entity_lists:
+        categorized = {
+            "patient_info": {"age": None, "gender": None},
+            "symptoms": [],
+            "medications": [],
+            "procedures": [],
+            "instructions": [],
+            "diagnosis": [],
+            "other": []
+        }
+        for ent in entities:
+            key = (tuple(ent["semantic_types"]), ent["text"])
+            category = categories.get(key)
+            if category is None:
+                category = categories[key] = rules.category(*key)
+            if category in ("age", "gender"):
+                categorized["patient_info"][category] = ent["text"].lower()
+            else:
+                categorized[category].append(ent["text"])
+        results.append(categorized)
+    return results
+
+
+def categorize_entity_records(entities: list) -> list:
+    """Categorized entities that keep their UMLS CUI and canonical name, one dict per mention"""
+    records = []
+    for ent in entities:
+        category = entity_category(ent)
+        if category in ENTITY_CATEGORIES:
+            records.append({
+                "category": category,
+                "text": ent["text"],
+                "umls_cui": ent.get("umls_cui"),
+                "canonical_name": ent.get("canonical_name")
+            })
+    return records
\ No newline at end of file
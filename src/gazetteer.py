@@ -0,0 +1,81 @@
+import json
+import os
+import re
+import threading
+
+# Fast extraction tier: a phrase matcher over a curated vocabulary
+# (data/gazetteer.json) that yields entities in the same shape as
+# extract_entities without running the NER model or the UMLS linker. Each
+# term's semantic types are those of its curated category, so
+# categorize_entities files it where the curator put it.
+
+GAZETTEER_PATH = os.environ.get(
+    "TELEMED_GAZETTEER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "gazetteer.json")
+)
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+class Gazetteer:
+    def __init__(self, path=GAZETTEER_PATH):
+        import spacy
+        from spacy.matcher import PhraseMatcher
+
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        self.version = config["version"]
+        # Tokenizer only: matching needs no tagger, parser or NER
+        self.nlp = spacy.blank("en")
+        self.matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        self._concepts = {}
+        for category, terms in config["terms"].items():
+            types = config["category_types"][category]
+            for term in terms:
+                key = f"{category}:{term['cui'] or term['aliases'][0]}"
+                self._concepts[self.nlp.vocab.strings.add(key)] = {
+                    "semantic_types": list(types),
+                    "umls_cui": term["cui"],
+                    "canonical_name": term["canonical_name"]
+                }
+                patterns = list(self.nlp.tokenizer.pipe(term["aliases"]))
+                # spaCy 2 takes patterns as *args, spaCy 3 as a list
+                try:
+                    self.matcher.add(key, patterns)
+                except (TypeError, ValueError):
+                    self.matcher.add(key, None, *patterns)
+        self._patient_patterns = [
+            re.compile(pattern, re.IGNORECASE) for pattern in config.get("patient_info_patterns", {}).values()
+        ]
+
+    def match(self, text) -> list:
+        """(start_char, end_char, entity) for each vocabulary hit, longest match first on overlaps"""
+        doc = self.nlp.make_doc(text)
+        found = []
+        for match_id, start, end in self.matcher(doc):
+            span = doc[start:end]
+            found.append((span.start_char, span.end_char, dict(self._concepts[match_id], text=span.text)))
+        for pattern in self._patient_patterns:
+            for m in pattern.finditer(text):
+                found.append((m.start(), m.end(), {
+                    "text": m.group(0), "semantic_types": [], "umls_cui": None, "canonical_name": None
+                }))
+        return _drop_overlaps(found)
+
+
+def _drop_overlaps(matches):
+    kept = []
+    for start, end, entity in sorted(matches, key=lambda m: (m[0] - m[1], m[0])):
+        if all(end <= s or start >= e for s, e, _ in kept):
+            kept.append((start, end, entity))
+    return sorted(kept, key=lambda m: m[0])
+
+
+def get_gazetteer():
+    """The process-wide gazetteer, compiled on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
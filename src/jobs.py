@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from src.transcript_cache import audio_hash, get_cached_segments, store_segments
+
+# Background audio jobs for the dashboard: transcribe -> extract -> store runs on
+# a bounded worker pool so the Streamlit script only submits and polls. Workers
+# share the process-wide Whisper and scispaCy models. Transcripts are cached by
+# audio content, and an upload identical to a job still in flight joins that job.
+
+MAX_CONCURRENT_JOBS = int(os.environ.get("TELEMED_JOB_WORKERS", "2"))
+# Finished jobs are forgotten after this long
+JOB_RETENTION_SECONDS = 3600
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """State of one background audio job; read it through JobQueue.status()"""
+
+    def __init__(self, options):
+        self.id = uuid.uuid4().hex
+        self.options = options
+        self.state = QUEUED
+        self.stage = "Waiting for a free worker"
+        self.decoded_seconds = 0.0
+        self.skipped_seconds = None
+        self.segments = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def dedupe_key(self):
+        options = self.options
+        return (options["audio_hash"], options["model_size"], options["precision"], options["vad"], options["extract"],
+                options["extraction_mode"], options["store"], options["session_id"])
+
+    def cache_variant(self):
+        # Quantized or trimmed decodes can differ slightly, so they are cached apart
+        variant = self.options["model_size"]
+        if self.options["precision"] != "default":
+            variant += f"-{self.options['precision']}"
+        if self.options["vad"]:
+            variant += "-vad"
+        return variant
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Bounded pool of background transcribe -> extract -> store jobs"""
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="telemed-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit_audio(self, audio_bytes, model_size="base", precision="default", vad=False, extract=True,
+                     extraction_mode="full", store=True, session_id=None):
+        """Queue an uploaded recording and return its job id
+
+        vad=True cuts long silences before transcription (see src/vad.py).
+
+        Resubmitting a recording that is already queued or running with the
+        same options returns the existing job instead of starting another.
+        """
+        self._forget_finished()
+        digest = audio_hash(audio_bytes)
+        job = Job({
+            "audio_bytes": audio_bytes,
+            "audio_hash": digest,
+            "model_size": model_size,
+            "precision": precision,
+            "vad": vad,
+            "extract": extract,
+            "extraction_mode": extraction_mode,
+            "store": store,
+            "session_id": session_id,
+        })
+        with self._lock:
+            for existing in self._jobs.values():
+                if existing.state not in FINISHED_STATES and existing.dedupe_key() == job.dedupe_key():
+                    return existing.id
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def status(self, job_id):
+        """Snapshot of a job for polling, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                "id": job.id,
+                "state": job.state,
+                "stage": job.stage,
+                "decoded_seconds": job.decoded_seconds,
+                "skipped_seconds": job.skipped_seconds,
+                "transcript": " ".join(seg["text"] for seg in job.segments),
+                "result": job.result,
+                "error": job.error,
+            }
+
+    def cancel(self, job_id):
+        """Ask a job to stop; it stops at the next segment boundary"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def _update(self, job, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+
+    def _forget_finished(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def _run(self, job):
+        try:
+            job.check_cancelled()
+            self._update(job, state=RUNNING, stage="Transcribing")
+            result = self._process(job)
+            self._update(job, state=SUCCEEDED, stage="Done", result=result)
+        except JobCancelled:
+            self._update(job, state=CANCELLED, stage="Cancelled")
+        except Exception as e:
+            print(f"Audio job {job.id} failed: {e}")
+            self._update(job, state=FAILED, stage="Failed", error=str(e))
+        finally:
+            job.options.pop("audio_bytes", None)
+            self._update(job, finished_at=time.time())
+
+    def _transcribe(self, job, extract):
+        """Decode the upload segment by segment, handing each segment's text to extract"""
+        from src.transcriber import decode_audio, iter_transcript_segments
+
+        options = job.options
+        # The upload is decoded straight from memory; nothing is written to disk
+        source = options["audio_bytes"]
+        if options["vad"]:
+            from src.vad import trim_silence
+
+            source = trim_silence(decode_audio(source))
+            print(f"Audio job {job.id}: {source.report()}")
+            self._update(job, skipped_seconds=source.skipped_seconds)
+        for segment in iter_transcript_segments(source, model_size=options["model_size"], precision=options["precision"]):
+            job.check_cancelled()
+            with self._lock:
+                job.segments.append(segment)
+                job.decoded_seconds = segment["end"]
+            extract(segment["text"])
+
+    def _process(self, job):
+        from src.entity_extractor import categorize_entities, extract_entities
+
+        options = job.options
+        # Extraction runs on its own thread so segment N is extracted while
+        # segment N+1 decodes; one worker keeps the entities in segment order
+        extraction = ThreadPoolExecutor(max_workers=1, thread_name_prefix="telemed-extract")
+        futures = []
+
+        def extract(text):
+            if options["extract"]:
+                futures.append(extraction.submit(extract_entities, text, mode=options["extraction_mode"]))
+
+        try:
+            cached = get_cached_segments(options["audio_hash"], job.cache_variant())
+            if cached is not None:
+                with self._lock:
+                    job.segments = cached
+                    job.decoded_seconds = cached[-1]["end"] if cached else 0.0
+                for segment in cached:
+                    extract(segment["text"])
+            else:
+                self._transcribe(job, extract)
+                try:
+                    store_segments(options["audio_hash"], job.cache_variant(), job.segments)
+                except OSError as e:
+                    print(f"Could not cache transcript for job {job.id}: {e}")
+
+            if futures:
+                self._update(job, stage="Extracting entities")
+            entities = []
+            for future in futures:
+                job.check_cancelled()
+                entities.extend(future.result())
+        finally:
+            # On failure or cancellation, drop extractions that have not started
+            extraction.shutdown(wait=False, cancel_futures=True)
+
+        transcript = " ".join(seg["text"] for seg in job.segments)
+        structured_data = categorize_entities(entities) if options["extract"] else None
+
+        session_id = None
+        if options["store"] and structured_data is not None:
+            job.check_cancelled()
+            from src.db_writer import store_consultation_with_transcript
+
+            self._update(job, stage="Saving")
+            session_id = options["session_id"] or f"upload_{datetime.utcnow():%Y%m%d%H%M%S}_{job.id[:6]}"
+            # Fast-mode entities are left for the backfill to redo with the full linker
+            store_consultation_with_transcript(
+                structured_data, transcript, session_id=session_id, entities=entities,
+                mark_current=options["extraction_mode"] == "full"
+            )
+
+        return {
+            "transcript": transcript,
+            "structured_data": structured_data,
+            "session_id": session_id,
+            "skipped_seconds": job.skipped_seconds,
+        }
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# Long-recording mode: cut the audio at pauses into overlapping chunks, transcribe
+# the chunks in a process pool (one Whisper model per worker), then stitch the
+# texts back together, dropping words repeated in the overlaps.
+
+SAMPLE_RATE = 16000
+DEFAULT_CHUNK_SECONDS = 60
+DEFAULT_OVERLAP_SECONDS = 2
+MIN_SILENCE_MS = 400
+# Pause search resolution; pydub's default 1 ms step makes the scan per-sample slow on long recordings
+SILENCE_SEEK_STEP_MS = 20
+# Longest run of words compared when removing text duplicated by an overlap
+MAX_OVERLAP_WORDS = 30
+
+
+def find_chunk_bounds(audio_segment, chunk_seconds=DEFAULT_CHUNK_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+    """Return [(start_ms, end_ms)] chunks cut at the pause closest to each chunk_seconds mark
+
+    Every chunk after the first starts overlap_seconds before the previous cut
+    so words at a cut are heard whole by at least one chunk.
+    """
+    from pydub.silence import detect_silence
+
+    duration = len(audio_segment)
+    chunk_ms = int(chunk_seconds * 1000)
+    if duration <= chunk_ms:
+        return [(0, duration)]
+
+    silence_thresh = audio_segment.dBFS - 16
+    pauses = [
+        (start + end) // 2
+        for start, end in detect_silence(
+            audio_segment, min_silence_len=MIN_SILENCE_MS, silence_thresh=silence_thresh, seek_step=SILENCE_SEEK_STEP_MS
+        )
+    ]
+
+    cuts = []
+    position = 0
+    while duration - position > chunk_ms:
+        target = position + chunk_ms
+        # Prefer a pause in the last third of the chunk; otherwise cut hard at the target
+        candidates = [p for p in pauses if position + chunk_ms * 2 // 3 <= p <= target]
+        cut = max(candidates) if candidates else target
+        cuts.append(cut)
+        position = cut
+
+    overlap_ms = int(overlap_seconds * 1000)
+    bounds = []
+    start = 0
+    for cut in cuts + [duration]:
+        bounds.append((max(0, start - overlap_ms) if bounds else 0, cut))
+        start = cut
+    return bounds
+
+
+def _to_model_input(audio_segment):
+    """pydub segment -> 16 kHz mono float32 array in [-1, 1], the layout Whisper expects"""
+    import numpy as np
+
+    segment = audio_segment.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    return np.array(segment.get_array_of_samples(), dtype=np.float32) / 32768.0
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def stitch_texts(texts):
+    """Join chunk transcripts, dropping the words a chunk repeats from the end of the previous one"""
+    words = []
+    for text in texts:
+        new_words = text.split()
+        if not new_words:
+            continue
+        tail = [_normalize_word(w) for w in words[-MAX_OVERLAP_WORDS:]]
+        head = [_normalize_word(w) for w in new_words[:MAX_OVERLAP_WORDS]]
+        overlap = 0
+        for size in range(min(len(tail), len(head)), 0, -1):
+            if tail[-size:] == head[:size]:
+                overlap = size
+                break
+        words.extend(new_words[overlap:])
+    return " ".join(words)
+
+
+_worker_model_size = None
+
+
+def _init_worker(model_size, threads):
+    global _worker_model_size
+    import torch
+    from src.transcriber import get_model
+
+    # Split the cores between workers instead of letting each one grab them all
+    torch.set_num_threads(threads)
+    _worker_model_size = model_size
+    get_model(model_size, "cpu")
+
+
+def _transcribe_chunk(samples):
+    from src.transcriber import get_model
+
+    model = get_model(_worker_model_size, "cpu")
+    return model.transcribe(samples, fp16=False)["text"].strip()
+
+
+def transcribe_long_audio(file_path, model_size="base", workers=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                          overlap_seconds=DEFAULT_OVERLAP_SECONDS) -> str:
+    """Transcribe a long recording as parallel chunks on CPU and return the stitched text"""
+    from pydub import AudioSegment
+
+    audio_segment = AudioSegment.from_file(file_path)
+    bounds = find_chunk_bounds(audio_segment, chunk_seconds, overlap_seconds)
+    chunks = [_to_model_input(audio_segment[start:end]) for start, end in bounds]
+
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # spawn, not fork: forking a parent whose torch thread pools are already running can deadlock the children
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_size, threads)
+    ) as pool:
+        texts = list(pool.map(_transcribe_chunk, chunks))
+    return stitch_texts(texts)
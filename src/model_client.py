@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Client side of src/model_server.py. When TELEMED_MODEL_SERVER points at a
+# running server (e.g. http://127.0.0.1:8765), src.transcriber and
+# src.entity_extractor send their work there instead of loading models in this
+# process. Whether the server is up is checked with a cached ping, so callers
+# fall back to local models when it is not running.
+
+SERVER_URL = os.environ.get("TELEMED_MODEL_SERVER", "").rstrip("/")
+PING_TTL_SECONDS = 30
+PING_TIMEOUT_SECONDS = 1.0
+# Transcription of a long recording can legitimately take many minutes
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("TELEMED_MODEL_SERVER_TIMEOUT", "1800"))
+
+_disabled = False
+_ping = {"ok": False, "checked_at": 0.0}
+_ping_lock = threading.Lock()
+
+
+class ModelServerUnavailable(Exception):
+    pass
+
+
+def disable_client():
+    """Always use local models in this process (the server itself calls this)"""
+    global _disabled
+    _disabled = True
+
+
+def mark_unavailable():
+    with _ping_lock:
+        _ping.update(ok=False, checked_at=time.monotonic())
+
+
+def server_available() -> bool:
+    """True when client mode is configured and the server answered a recent ping"""
+    if _disabled or not SERVER_URL:
+        return False
+    with _ping_lock:
+        if time.monotonic() - _ping["checked_at"] < PING_TTL_SECONDS:
+            return _ping["ok"]
+    try:
+        with urllib.request.urlopen(f"{SERVER_URL}/health", timeout=PING_TIMEOUT_SECONDS) as response:
+            ok = response.status == 200
+    except (OSError, ValueError):
+        ok = False
+    with _ping_lock:
+        _ping.update(ok=ok, checked_at=time.monotonic())
+    return ok
+
+
+def _audio_payload(source):
+    """(body bytes, audio format) for any input src.transcriber.decode_audio accepts"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read(), "file"
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source), "file"
+    if hasattr(source, "getvalue"):
+        return source.getvalue(), "file"
+    if hasattr(source, "read"):
+        return source.read(), "file"
+    # Already decoded: 16 kHz float32 samples
+    return source.astype("float32").tobytes(), "f32le"
+
+
+def _post(path, body, params=None, content_type="application/octet-stream"):
+    url = f"{SERVER_URL}{path}"
+    if params:
+        url += "?" + urllib.parse.urlencode(params)
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": content_type})
+    try:
+        return urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS)
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", "replace")
+        raise RuntimeError(f"Model server error {e.code} on {path}: {detail}") from e
+    except OSError as e:
+        mark_unavailable()
+        raise ModelServerUnavailable(str(e)) from e
+
+
+def remote_transcribe(source, model_size="base", precision="default", vad=False) -> str:
+    from src.vad import VoicedAudio
+
+    if isinstance(source, VoicedAudio):
+        source, vad = source.audio, False
+    body, audio_format = _audio_payload(source)
+    params = {"model_size": model_size, "precision": precision, "vad": int(vad), "format": audio_format}
+    with _post("/transcribe", body, params) as response:
+        return json.load(response)["text"]
+
+
+def remote_transcript_segments(source, model_size="base", precision="default", vad=False):
+    """Stream segments from the server as it decodes them (newline-delimited JSON)"""
+    from src.vad import VoicedAudio
+
+    voiced = None
+    if isinstance(source, VoicedAudio):
+        # Already trimmed here: send the voiced audio and map timestamps back locally
+        voiced, source, vad = source, source.audio, False
+    body, audio_format = _audio_payload(source)
+    params = {
+        "model_size": model_size, "precision": precision, "vad": int(vad), "format": audio_format, "stream": 1
+    }
+    with _post("/transcribe", body, params) as response:
+        for line in response:
+            if not line.strip():
+                continue
+            segment = json.loads(line)
+            if "error" in segment:
+                raise RuntimeError(f"Model server error on /transcribe: {segment['error']}")
+            if voiced is not None:
+                segment["start"] = round(voiced.to_original(segment["start"]), 2)
+                segment["end"] = round(voiced.to_original(segment["end"], is_end=True), 2)
+            yield segment
+
+
+def remote_extract(texts, mode="full", fallback=None) -> list:
+    """Entity lists for a list of texts, in order
+
+    mode="fast" runs gazetteer extraction on the server, with fallback as the
+    policy for NER spans the gazetteer missed.
+    """
+    payload = {"texts": list(texts)}
+    if mode != "full":
+        payload.update(mode=mode, fallback=fallback)
+    body = json.dumps(payload).encode("utf-8")
+    with _post("/extract", body, content_type="application/json") as response:
+        return json.load(response)["entities"]
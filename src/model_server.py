@@ -0,0 +1,218 @@
+"""
+Local inference server that owns the Whisper and scispaCy/UMLS models, so the
+dashboard, scripts and backfill workers share one copy of them.
+
+Run it with `python -m src.model_server` and point consumers at it with
+TELEMED_MODEL_SERVER=http://127.0.0.1:8765 (see src/model_client.py).
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.model_client import disable_client
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.environ.get("TELEMED_MODEL_SERVER_PORT", "8765"))
+# Extract requests arriving within this window are run as one nlp.pipe batch
+BATCH_WAIT_SECONDS = 0.01
+MAX_BATCH_TEXTS = 64
+
+
+class ExtractBatcher:
+    """Coalesces concurrent /extract requests into single nlp.pipe calls"""
+
+    def __init__(self, max_batch_texts=MAX_BATCH_TEXTS, max_wait_seconds=BATCH_WAIT_SECONDS):
+        self.max_batch_texts = max_batch_texts
+        self.max_wait_seconds = max_wait_seconds
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        threading.Thread(target=self._run, name="extract-batcher", daemon=True).start()
+
+    def extract(self, texts) -> list:
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _collect(self):
+        items = [self._queue.get()]
+        size = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait_seconds
+        while size < self.max_batch_texts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    def _run(self):
+        from src.entity_extractor import extract_entities_batch
+
+        while True:
+            items = self._collect()
+            texts = [text for request_texts, _ in items for text in request_texts]
+            try:
+                results = list(extract_entities_batch(texts, batch_size=max(len(texts), 1)))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(items)
+            position = 0
+            for request_texts, future in items:
+                future.set_result(results[position:position + len(request_texts)])
+                position += len(request_texts)
+
+
+class ModelRequestHandler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def log_message(self, format, *args):
+        # Keep request logging out of the console; errors are printed explicitly
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+        from src.entity_extractor import extractor_version
+        from src.transcriber import loaded_models
+
+        self._send_json(200, {
+            "status": "ok",
+            "whisper_models": loaded_models(),
+            "extractor_version": extractor_version(),
+            "extract_batches": self.batcher.batches,
+            "extract_requests": self.batcher.requests,
+        })
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            if url.path == "/extract":
+                self._extract(json.loads(self._read_body()))
+            elif url.path == "/transcribe":
+                self._transcribe(params)
+            else:
+                self._send_json(404, {"error": "not found"})
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            print(f"Model server error on {url.path}: {e}")
+            self._send_json(500, {"error": str(e)})
+
+    def _extract(self, request):
+        from src.entity_extractor import FAST_FALLBACK, extract_entities_fast
+
+        mode = request.get("mode", "full")
+        if mode == "full":
+            entities = self.batcher.extract(request["texts"])
+        elif mode == "fast":
+            # Gazetteer matching is cheap; only the fallback linking needs the shared pipeline
+            fallback = request.get("fallback") or FAST_FALLBACK
+            entities = [extract_entities_fast(text, fallback=fallback) for text in request["texts"]]
+        else:
+            raise ValueError(f"Unknown extraction mode {mode!r}")
+        self._send_json(200, {"entities": entities})
+
+    def _transcribe(self, params):
+        from src.transcriber import iter_transcript_segments, transcribe_audio
+
+        body = self._read_body()
+        if params.get("format") == "f32le":
+            import numpy as np
+            source = np.frombuffer(body, dtype=np.float32)
+        else:
+            source = body
+        options = {
+            "model_size": params.get("model_size", "base"),
+            "precision": params.get("precision", "default"),
+            "vad": params.get("vad") == "1",
+        }
+
+        if params.get("stream") != "1":
+            self._send_json(200, {"text": transcribe_audio(source, **options)})
+            return
+
+        # One JSON segment per line, written as each window is decoded
+        segments = iter_transcript_segments(source, **options)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for segment in segments:
+                self.wfile.write(json.dumps(segment).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away (e.g. a cancelled job); stop decoding for it
+            segments.close()
+        except Exception as e:
+            print(f"Model server error on /transcribe: {e}")
+            self.wfile.write(json.dumps({"error": str(e)}).encode("utf-8") + b"\n")
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, preload_whisper=(), precision="default", preload_extractor=True):
+    # The server must run the models itself, never forward to another server
+    disable_client()
+    from src.entity_extractor import get_pipeline
+    from src.transcriber import get_model
+
+    for model_size in preload_whisper:
+        print(f"Loading Whisper {model_size} ({precision})...")
+        get_model(model_size, precision=precision)
+    if preload_extractor:
+        print("Loading scispaCy pipeline and UMLS linker...")
+        get_pipeline()
+
+    ModelRequestHandler.batcher = ExtractBatcher()
+    server = ThreadingHTTPServer((host, port), ModelRequestHandler)
+    server.daemon_threads = True
+    print(f"Model server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to bind (keep it local)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--whisper", nargs="*", default=["base"], help="Whisper model sizes to load at startup")
+    parser.add_argument("--precision", default="default", help="Precision of the preloaded Whisper models")
+    parser.add_argument("--lazy-extractor", action="store_true", help="Load the scispaCy pipeline on first request")
+    args = parser.parse_args()
+    serve(
+        host=args.host,
+        port=args.port,
+        preload_whisper=args.whisper,
+        precision=args.precision,
+        preload_extractor=not args.lazy_extractor
+    )
@@ -0,0 +1,98 @@
+import re
+
+# categorize_entities stores age/gender as the raw entity text ("45-year-old",
+# "female patient"); these helpers derive the indexed patient_age_years and
+# patient_gender_code columns from it and turn search input into SQL on them.
+
+GENDER_CODES = ("female", "male", "other")
+
+_AGE_PATTERN = re.compile(r"\b(\d{1,3})\s*(?:-|\s)?\s*(?:year|yr|yo\b|y/o)", re.IGNORECASE)
+_NUMBER_PATTERN = re.compile(r"\b(\d{1,3})\b")
+_FEMALE_WORDS = {"female", "woman", "women", "girl", "lady"}
+_MALE_WORDS = {"male", "man", "men", "boy", "gentleman"}
+_OTHER_WORDS = {"other", "nonbinary", "non-binary", "intersex"}
+# Single-letter shorthands are only trusted as search input, not in free text
+_GENDER_SEARCH_TERMS = {"f": "female", "m": "male"}
+
+_RANGE_TERM = re.compile(r"^(\d{1,3})\s*-\s*(\d{1,3})$")
+_BOUND_TERM = re.compile(r"^(<=|>=|<|>)\s*(\d{1,3})$")
+_AGE_TERM = re.compile(r"^(\d{1,3})$")
+
+MAX_AGE = 130
+
+
+def parse_age(value):
+    """Extract an age in years from free text such as '45-year-old', or None"""
+    if value is None:
+        return None
+    text = str(value)
+    match = _AGE_PATTERN.search(text) or _NUMBER_PATTERN.search(text)
+    if not match:
+        return None
+    age = int(match.group(1))
+    return age if age <= MAX_AGE else None
+
+
+def parse_gender(value):
+    """Map free text such as 'female patient' to 'female' / 'male' / 'other', or None"""
+    if value is None:
+        return None
+    words = set(re.findall(r"[a-z][a-z-]*", str(value).lower()))
+    # Check female first: "female" also contains "male" as a substring in raw text
+    if words & _FEMALE_WORDS:
+        return "female"
+    if words & _MALE_WORDS:
+        return "male"
+    if words & _OTHER_WORDS:
+        return "other"
+    return None
+
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input only matches literally"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def plan_patient_search(term):
+    """Turn search input into (where_sql, params) over indexed columns
+
+    Each whitespace-separated token becomes one condition and all conditions
+    must hold, e.g. "female 30-40":
+      - "45"            exact age         patient_age_years = 45
+      - "45-year-old"   exact age, in the form the app stores it
+      - "30-40", ">=65" age range         patient_age_years BETWEEN / >=
+      - "female", "man" gender            patient_gender_code = 'female'
+      - anything else   session prefix    session_id LIKE 'consult_0%'
+    """
+    conditions = []
+    params = []
+    for token in term.split():
+        lowered = token.lower()
+        range_match = _RANGE_TERM.match(lowered)
+        bound_match = _BOUND_TERM.match(lowered)
+        stored_age = parse_age(lowered) if _AGE_PATTERN.search(lowered) else None
+        gender = _GENDER_SEARCH_TERMS.get(lowered)
+        if lowered in _FEMALE_WORDS | _MALE_WORDS | _OTHER_WORDS:
+            gender = parse_gender(lowered)
+
+        if _AGE_TERM.match(lowered):
+            conditions.append("patient_age_years = %s")
+            params.append(int(lowered))
+        elif range_match:
+            low, high = sorted((int(range_match.group(1)), int(range_match.group(2))))
+            conditions.append("patient_age_years BETWEEN %s AND %s")
+            params.extend([low, high])
+        elif bound_match:
+            conditions.append(f"patient_age_years {bound_match.group(1)} %s")
+            params.append(int(bound_match.group(2)))
+        elif stored_age is not None:
+            conditions.append("patient_age_years = %s")
+            params.append(stored_age)
+        elif gender:
+            conditions.append("patient_gender_code = %s")
+            params.append(gender)
+        else:
+            conditions.append("session_id LIKE %s")
+            params.append(escape_like(token) + "%")
+
+    return " AND ".join(conditions), params
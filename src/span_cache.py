@@ -0,0 +1,206 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent cache of UMLS linking results per mention. Transcripts repeat the
+# same spans ("fever", "chest x-ray") constantly, and each one otherwise costs an
+# ANN candidate search in the linker. Entries are keyed on the normalized span
+# text plus the linker/KB version, so upgrading scispaCy or changing the linker
+# config starts from a cold cache instead of serving stale concepts.
+
+CACHE_PATH = os.environ.get(
+    "TELEMED_SPAN_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tmp", "span_concepts.sqlite3")
+)
+MAX_ENTRIES = int(os.environ.get("TELEMED_SPAN_CACHE_MAX_ENTRIES", "200000"))
+# Check the size cap after this many inserts rather than on every write
+EVICT_CHECK_INTERVAL = 1000
+# Evict down to this fraction of the cap so eviction does not run on every check
+EVICT_TARGET = 0.9
+
+
+def normalize_span(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class SpanConceptCache:
+    """SQLite map of (linker version, normalized span) -> ranked (cui, score) candidates"""
+
+    def __init__(self, path=CACHE_PATH, linker_version="", max_entries=MAX_ENTRIES):
+        self.path = path
+        self.linker_version = linker_version
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inserts_since_check = 0
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS span_concepts ("
+                " linker_version TEXT NOT NULL,"
+                " span TEXT NOT NULL,"
+                " candidates TEXT NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (linker_version, span))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_span_concepts_last_used ON span_concepts (last_used)")
+
+    def _connection(self):
+        # sqlite3 connections are per thread; WAL lets worker processes read while one writes
+        conn = getattr(self._local, "conn", None)
+        # A forked worker inherits the parent's thread-local connection, which
+        # SQLite must not use across fork(); leave it alone and open its own
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def __getstate__(self):
+        # Connections and locks are per process; worker processes reopen the file
+        state = self.__dict__.copy()
+        del state["_local"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def record(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get_many(self, spans) -> dict:
+        """Cached candidates for the given normalized spans; misses are absent"""
+        spans = list(set(spans))
+        if not spans:
+            return {}
+        conn = self._connection()
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(spans), 500):
+            chunk = spans[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT span, candidates FROM span_concepts WHERE linker_version = ? AND span IN ({placeholders})",
+                [self.linker_version] + chunk
+            ).fetchall()
+            found.update((span, [tuple(c) for c in json.loads(candidates)]) for span, candidates in rows)
+        if found:
+            with conn:
+                conn.executemany(
+                    "UPDATE span_concepts SET last_used = ? WHERE linker_version = ? AND span = ?",
+                    [(time.time(), self.linker_version, span) for span in found]
+                )
+        return found
+
+    def put_many(self, entries: dict):
+        """Store {normalized span: [(cui, score), ...]}"""
+        if not entries:
+            return
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO span_concepts (linker_version, span, candidates, last_used) VALUES (?, ?, ?, ?)",
+                [(self.linker_version, span, json.dumps(candidates), now) for span, candidates in entries.items()]
+            )
+        with self._lock:
+            self._inserts_since_check += len(entries)
+            due = self._inserts_since_check >= EVICT_CHECK_INTERVAL
+            if due:
+                self._inserts_since_check = 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries (of any version) once over the size cap"""
+        conn = self._connection()
+        total = conn.execute("SELECT COUNT(*) FROM span_concepts").fetchone()[0]
+        if total <= self.max_entries:
+            return
+        excess = total - int(self.max_entries * EVICT_TARGET)
+        with conn:
+            conn.execute(
+                "DELETE FROM span_concepts WHERE rowid IN "
+                "(SELECT rowid FROM span_concepts ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+        self.record("evictions", excess)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM span_concepts")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        looked_up = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / looked_up, 3) if looked_up else 0.0
+        return stats
+
+
+class CachedLinker:
+    """Pipeline component that runs the UMLS linker only on spans missing from the cache
+
+    Mentions the abbreviation detector expanded in this doc are always linked
+    fresh, because their linking depends on the surrounding text.
+    """
+
+    def __init__(self, linker, cache):
+        self.linker = linker
+        self.cache = cache
+        self.name = getattr(linker, "name", "scispacy_linker")
+
+    def __getattr__(self, name):
+        # Behave like the wrapped linker for everything else (umls, kb, k, ...)
+        if name == "linker":
+            raise AttributeError(name)
+        return getattr(self.linker, name)
+
+    def _abbreviation_spans(self, doc):
+        if not doc.has_extension("abbreviations"):
+            return set()
+        return {(abrv.start_char, abrv.end_char) for abrv in doc._.abbreviations}
+
+    def __call__(self, doc):
+        ents = list(doc.ents)
+        if not ents:
+            return doc
+        abbreviations = self._abbreviation_spans(doc)
+        cacheable = [ent for ent in ents if (ent.start_char, ent.end_char) not in abbreviations]
+        cached = self.cache.get_many(normalize_span(ent.text) for ent in cacheable)
+
+        misses = []
+        for ent in ents:
+            candidates = None
+            if (ent.start_char, ent.end_char) not in abbreviations:
+                candidates = cached.get(normalize_span(ent.text))
+            if candidates is None:
+                misses.append(ent)
+            else:
+                ent._.umls_ents = candidates
+        self.cache.record("hits", len(ents) - len(misses))
+        self.cache.record("misses", len(cacheable) - (len(ents) - len(misses)))
+        self.cache.record("bypassed", len(ents) - len(cacheable))
+
+        if misses:
+            # Link only the misses; span extension values live on the doc, keyed by
+            # offsets, so they survive restoring the full entity list afterwards
+            doc.ents = misses
+            try:
+                self.linker(doc)
+            finally:
+                doc.ents = ents
+            self.cache.put_many({
+                normalize_span(ent.text): [list(candidate) for candidate in ent._.umls_ents]
+                for ent in misses if (ent.start_char, ent.end_char) not in abbreviations
+            })
+        return doc
@@ -1,8 +1,308 @@
 import os
-os.environ["PATH"] += os.pathsep + r"C:\ffmpeg\bin" 
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
 
-def transcribe_audio(file_path: str, model_size="base") -> str:
-    import whisper
-    model = whisper.load_model(model_size)
-    result = model.transcribe(file_path)
-    return result["text"]
\ No newline at end of file
+from src.model_client import ModelServerUnavailable, remote_transcribe, remote_transcript_segments, server_available
+os.environ["PATH"] += os.pathsep + r"C:\ffmpeg\bin"
+
+# Upper bound on the memory held by resident Whisper models (in MB). When a new
+# model would push the registry over budget, the least recently used models are
+# evicted first. The model being requested is always kept, even if it alone
+# exceeds the budget.
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("WHISPER_MODEL_MEMORY_MB", "4096"))
+# Whisper's fixed input rate
+SAMPLE_RATE = 16000
+
+# "default" runs the stock model on the best available device. "cpu-fast" runs
+# on CPU with int8 dynamically quantized linear layers and a pinned thread count.
+PRECISIONS = ("default", "cpu-fast")
+CPU_THREADS = int(os.environ.get("WHISPER_CPU_THREADS", "0")) or os.cpu_count() or 1
+
+_models = OrderedDict()  # (model_size, device, precision) -> (model, size_in_bytes)
+_load_locks = {}
+_inference_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _resolve_device(device=None) -> str:
+    if device:
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _model_key(model_size, device, precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown Whisper precision {precision!r}, expected one of {PRECISIONS}")
+    if precision == "cpu-fast":
+        return (model_size, "cpu", precision)
+    return (model_size, _resolve_device(device), precision)
+
+
+def _model_nbytes(model) -> int:
+    # state_dict rather than parameters(): quantized layers keep their int8
+    # weights in packed params that parameters() does not list
+    import torch
+
+    total = 0
+    for value in model.state_dict().values():
+        tensors = value if isinstance(value, tuple) else (value,)
+        total += sum(t.numel() * t.element_size() for t in tensors if isinstance(t, torch.Tensor))
+    return total
+
+
+def _quantize_for_cpu(model):
+    """int8 dynamic quantization of the linear layers of a CPU Whisper model
+
+    Whisper's layers are whisper.model.Linear, a subclass that quantize_dynamic
+    does not match, so they are swapped for plain nn.Linear first.
+    """
+    import torch
+    from torch import nn
+
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, nn.Linear) and type(child) is not nn.Linear:
+                plain = nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                plain.load_state_dict(child.state_dict())
+                setattr(module, name, plain)
+    return torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def _evict_over_budget(keep_key):
+    """Drop least recently used models until the registry fits the budget"""
+    budget = MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+    total = sum(nbytes for _, nbytes in _models.values())
+    for key in list(_models.keys()):
+        if total <= budget:
+            break
+        if key == keep_key:
+            continue
+        _, nbytes = _models.pop(key)
+        total -= nbytes
+        print(f"Evicted Whisper model {key[0]} ({key[1]}, {key[2]}) from registry")
+
+
+def get_model(model_size="base", device=None, precision="default"):
+    """Return a resident Whisper model, loading it on first use
+
+    precision="cpu-fast" always runs on CPU, whatever device is given.
+    """
+    key = _model_key(model_size, device, precision)
+    with _registry_lock:
+        if key in _models:
+            _models.move_to_end(key)
+            return _models[key][0]
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    # Load outside the registry lock so other sizes stay available meanwhile;
+    # the per-key lock makes concurrent callers wait for a single load.
+    with load_lock:
+        with _registry_lock:
+            if key in _models:
+                _models.move_to_end(key)
+                return _models[key][0]
+
+        import whisper
+        model = whisper.load_model(model_size, device=key[1])
+        if precision == "cpu-fast":
+            import torch
+
+            torch.set_num_threads(CPU_THREADS)
+            model = _quantize_for_cpu(model)
+
+        with _registry_lock:
+            _models[key] = (model, _model_nbytes(model))
+            _evict_over_budget(key)
+        return model
+
+
+def warm_up_model(model_size="base", device=None, precision="default"):
+    """Preload a Whisper model into the registry so the first upload is fast
+
+    Does nothing while a model server is running, since transcription then
+    happens there and a local copy would only take up memory.
+    """
+    if server_available():
+        return model_size
+    get_model(model_size, device, precision)
+    return model_size
+
+
+def loaded_models() -> list:
+    """List resident models, least recently used first"""
+    with _registry_lock:
+        return [
+            {"model_size": size, "device": device, "precision": precision, "size_mb": round(nbytes / (1024 * 1024), 1)}
+            for (size, device, precision), (_, nbytes) in _models.items()
+        ]
+
+
+def clear_models():
+    """Release every resident model"""
+    with _registry_lock:
+        _models.clear()
+
+
+def inference_lock(model_size="base", device=None, precision="default"):
+    """Lock serialising decodes on a shared model (Whisper's KV-cache hooks are per-module)"""
+    key = _model_key(model_size, device, precision)
+    with _registry_lock:
+        return _inference_locks.setdefault(key, threading.Lock())
+
+
+def _ffmpeg_decode(input_arg, data=None):
+    # Same conversion as whisper.load_audio, but the input may be stdin
+    cmd = ["ffmpeg"] + (["-nostdin"] if data is None else []) + [
+        "-threads", "0",
+        "-i", input_arg,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE),
+        "-"
+    ]
+    return subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+
+
+def decode_audio(source):
+    """Decode audio to the 16 kHz mono float32 array Whisper takes
+
+    source may be a file path, the raw bytes of an audio file, a binary
+    file-like object, or an already decoded array (returned unchanged).
+    Bytes are piped through ffmpeg's stdin, so uploads never touch disk.
+    """
+    import numpy as np
+
+    if isinstance(source, np.ndarray):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        pcm = _ffmpeg_decode(os.fspath(source))
+    else:
+        if hasattr(source, "getbuffer"):
+            data = source.getbuffer()
+        elif hasattr(source, "read"):
+            data = source.read()
+        else:
+            data = source
+        try:
+            pcm = _ffmpeg_decode("pipe:0", data)
+        except subprocess.CalledProcessError:
+            # Containers that keep their index at the end (some m4a/mp4) cannot
+            # be read from a pipe; those are the only inputs that go via disk
+            with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
+                tmp_file.write(data)
+                tmp_file_path = tmp_file.name
+            try:
+                pcm = _ffmpeg_decode(tmp_file_path)
+            finally:
+                os.unlink(tmp_file_path)
+    return np.frombuffer(pcm, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def _readable_once(source):
+    """Read a one-shot stream into bytes, so a failed server attempt can still decode it locally"""
+    if hasattr(source, "read") and not hasattr(source, "getvalue"):
+        return source.read()
+    return source
+
+
+def _prepare_audio(source, vad):
+    """Decoded audio plus the VoicedAudio map when silence is trimmed (else None)"""
+    from src.vad import VoicedAudio, trim_silence
+
+    if isinstance(source, VoicedAudio):
+        return source.audio, source
+    audio = decode_audio(source)
+    if not vad:
+        return audio, None
+    voiced = trim_silence(audio)
+    print(voiced.report())
+    return voiced.audio, voiced
+
+
+def transcribe_audio(source, model_size="base", device=None, vad=False, precision="default") -> str:
+    """Transcribe a file path, audio bytes, file-like object or decoded array
+
+    With vad=True long silences are cut out before decoding (see src/vad.py).
+    precision is one of PRECISIONS. When a model server is running (see
+    src/model_client.py) the work is sent there and device is its choice.
+    """
+    if server_available():
+        source = _readable_once(source)
+        try:
+            return remote_transcribe(source, model_size, precision, vad)
+        except ModelServerUnavailable:
+            pass  # Server went away since the last ping; decode locally
+    model = get_model(model_size, device, precision)
+    audio, _ = _prepare_audio(source, vad)
+    if len(audio) == 0:
+        return ""
+    with inference_lock(model_size, device, precision):
+        # fp16 only exists on GPU; asking for it on CPU just logs a warning
+        result = model.transcribe(audio, fp16=model.device.type != "cpu")
+    return result["text"]
+
+
+def iter_transcript_segments(source, model_size="base", device=None, vad=False, precision="default"):
+    """Yield Whisper segments ({"start", "end", "text"}, seconds) as each 30 s window is decoded
+
+    Mirrors Whisper's own seek loop: the last segment of a window may be cut
+    off mid-utterance, so it is dropped and decoding resumes at its start.
+    The model lock is held per window, so concurrent streams interleave.
+    source is anything decode_audio accepts, or a VoicedAudio from
+    src.vad.trim_silence; with vad=True silences are trimmed here. Either way
+    timestamps refer to the original recording. Uses the model server when
+    one is running.
+    """
+    if server_available():
+        source = _readable_once(source)
+        try:
+            yield from remote_transcript_segments(source, model_size, precision, vad)
+            return
+        except ModelServerUnavailable:
+            pass  # Could not connect; nothing was yielded yet, so decode locally
+
+    from whisper.audio import N_SAMPLES
+
+    model = get_model(model_size, device, precision)
+    audio, voiced = _prepare_audio(source, vad)
+    seek = 0
+    previous_text = ""
+    # Detected on the first window with speech, then fixed: re-detecting on
+    # every window costs an extra encoder pass and can flip mid-recording
+    language = None
+    while seek < len(audio):
+        window = audio[seek:seek + N_SAMPLES]
+        is_last_window = seek + N_SAMPLES >= len(audio)
+        with inference_lock(model_size, device, precision):
+            result = model.transcribe(
+                window,
+                initial_prompt=previous_text[-200:] or None,
+                condition_on_previous_text=False,
+                language=language,
+                fp16=model.device.type != "cpu"
+            )
+
+        segments = [seg for seg in result["segments"] if seg["text"].strip()]
+        if language is None and segments:
+            language = result.get("language")
+        if not is_last_window and len(segments) > 1:
+            segments = segments[:-1]
+            advance = int(segments[-1]["end"] * SAMPLE_RATE)
+        else:
+            advance = len(window)
+        # Guard against a zero-length advance on windows of pure silence/noise
+        advance = max(advance, SAMPLE_RATE)
+
+        offset = seek / SAMPLE_RATE
+        for seg in segments:
+            previous_text += seg["text"]
+            start, end = offset + seg["start"], offset + seg["end"]
+            if voiced is not None:
+                start, end = voiced.to_original(start), voiced.to_original(end, is_end=True)
+            yield {
+                "start": round(start, 2),
+                "end": round(end, 2),
+                "text": seg["text"].strip()
+            }
+        seek += advance
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# Persistent transcript cache keyed by (sha256 of the audio bytes, Whisper model
+# size), so a recording is transcribed once no matter how many reruns, browser
+# sessions or server processes see it. One JSON file per entry; when the
+# directory grows past its size budget the least recently read entries go first.
+
+CACHE_DIR = os.environ.get(
+    "TELEMED_TRANSCRIPT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tmp", "transcript_cache")
+)
+MAX_CACHE_MB = int(os.environ.get("TELEMED_TRANSCRIPT_CACHE_MB", "200"))
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def audio_hash(data) -> str:
+    """sha256 hex digest of the raw audio bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _entry_path(digest, model_size):
+    return os.path.join(CACHE_DIR, f"{digest}_{model_size}.json")
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cached_segments(digest, model_size):
+    """Cached segments ({"start", "end", "text"}) for this audio and model, or None
+
+    model_size may carry a variant suffix (e.g. "base-vad") for decodes that
+    used different preprocessing.
+    """
+    path = _entry_path(digest, model_size)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            segments = json.load(f)["segments"]
+    except (OSError, ValueError, KeyError):
+        _count("misses")
+        return None
+    try:
+        # Reads refresh the mtime, which orders eviction
+        os.utime(path)
+    except OSError:
+        pass
+    _count("hits")
+    return segments
+
+
+def store_segments(digest, model_size, segments):
+    """Save a finished transcription, then trim the cache to its size budget"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to a temp file and rename so concurrent readers never see half an entry
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"model_size": model_size, "segments": segments}, f)
+        os.replace(tmp_path, _entry_path(digest, model_size))
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _evict_over_budget()
+
+
+def _evict_over_budget():
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    budget = MAX_CACHE_MB * 1024 * 1024
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= budget:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        _count("evictions")
+
+
+def clear_cache():
+    """Delete every cached transcript"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".json"):
+            os.remove(os.path.join(CACHE_DIR, name))
+
+
+def cache_stats():
+    """Hit/miss/eviction counters for this process plus the current on-disk size"""
+    size = 0
+    entries = 0
+    if os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith(".json"):
+                entries += 1
+                size += os.path.getsize(os.path.join(CACHE_DIR, name))
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update({"entries": entries, "size_mb": round(size / (1024 * 1024), 2)})
+    return stats
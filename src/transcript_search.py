@@ -0,0 +1,54 @@
+import re
+
+# Helpers around the transcripts FULLTEXT index: choosing the MATCH mode for a
+# query and cutting a highlighted snippet out of each matching transcript.
+
+SNIPPET_WIDTH = 200
+
+_WORD = re.compile(r"[\w'-]+")
+
+
+def query_terms(query):
+    """Words of a search query that are worth highlighting"""
+    return [w.lower() for w in _WORD.findall(query) if len(w) > 1]
+
+
+def match_mode(query):
+    """Quoted phrases and +/- operators need BOOLEAN MODE; plain words rank better in NATURAL LANGUAGE MODE"""
+    if '"' in query or re.search(r"(^|\s)[+-]\w", query):
+        return "IN BOOLEAN MODE"
+    return "IN NATURAL LANGUAGE MODE"
+
+
+def make_snippet(text, terms, width=SNIPPET_WIDTH, marker="**"):
+    """Return the window of text with the most term hits, hits wrapped in marker"""
+    if not text:
+        return ""
+    if not terms:
+        return text[:width]
+
+    # Match whole words starting with a term so "azithro" also hits "azithromycin"
+    pattern = re.compile(r"\b(" + "|".join(re.escape(t) for t in terms) + r")[\w'-]*", re.IGNORECASE)
+    hits = [m.start() for m in pattern.finditer(text)]
+    if not hits:
+        return text[:width]
+
+    # Slide over hit positions and keep the window covering the most hits
+    best_start, best_count = hits[0], 0
+    right = 0
+    for left, start in enumerate(hits):
+        while right < len(hits) and hits[right] < start + width:
+            right += 1
+        if right - left > best_count:
+            best_start, best_count = start, right - left
+
+    start = max(0, best_start - width // 4)
+    end = min(len(text), start + width)
+    # Snap the window to word boundaries
+    if start > 0 and " " in text[start:best_start]:
+        start = text.index(" ", start, best_start) + 1
+    if end < len(text) and " " in text[best_start:end]:
+        end = text.rindex(" ", best_start, end)
+    snippet = pattern.sub(lambda m: f"{marker}{m.group(0)}{marker}", text[start:end])
+    snippet = " ".join(snippet.split())
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
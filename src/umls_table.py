@@ -0,0 +1,205 @@
+"""
+Compact, memory-mapped UMLS lookup table: cui -> (canonical_name, semantic types,
+whether the concept has a definition), the only fields extraction consumes.
+
+The full KB keeps every concept as Python objects in each process; this table
+is one file read through mmap, so worker processes share it via the page cache.
+Build it once with `python -m src.umls_table` (loads the KB one last time).
+
+Layout (little-endian):
+    header   magic, scispacy version (32 bytes, NUL padded), record count n
+    cuis     n fixed-width ASCII CUIs, sorted
+    offsets  n + 1 uint32 offsets into the record area
+    records  utf-8 "canonical_name \\x1f T047,T184 \\x1f 0|1"
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from importlib import metadata
+
+TABLE_PATH = os.environ.get(
+    "TELEMED_UMLS_TABLE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "umls_compact.tbl")
+)
+
+MAGIC = b"UMLSTBL1"
+CUI_WIDTH = 8  # "C" + 7 digits
+_HEADER = struct.Struct("<8s32sI")
+_OFFSET = struct.Struct("<I")
+_SEPARATOR = "\x1f"
+
+_table = None
+_table_loaded = False
+_table_lock = threading.Lock()
+
+
+def _scispacy_version():
+    try:
+        return metadata.version("scispacy")
+    except metadata.PackageNotFoundError:
+        return "missing"
+
+
+class CompactEntity:
+    """Stand-in for scispacy's Entity with just the fields the table keeps
+
+    definition is "" for concepts that have one (the text itself is not
+    stored) and None otherwise, which is all the linker's definition filter
+    looks at. aliases are not stored.
+    """
+
+    __slots__ = ("concept_id", "canonical_name", "types", "definition", "aliases")
+
+    def __init__(self, concept_id, canonical_name, types, has_definition):
+        self.concept_id = concept_id
+        self.canonical_name = canonical_name
+        self.types = types
+        self.definition = "" if has_definition else None
+        self.aliases = []
+
+
+class _CuiColumn:
+    """Sequence view of the sorted CUI array, for bisect"""
+
+    def __init__(self, buffer, start, count):
+        self._buffer = buffer
+        self._start = start
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        position = self._start + index * CUI_WIDTH
+        return bytes(self._buffer[position:position + CUI_WIDTH])
+
+
+class UmlsTable:
+    """Read-only view of a built table; lookups touch only the pages they need"""
+
+    def __init__(self, path=TABLE_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compact UMLS table")
+        self.scispacy_version = version.rstrip(b"\0").decode("ascii")
+        self._count = count
+        self._cuis = _CuiColumn(self._mmap, _HEADER.size, count)
+        self._offsets_start = _HEADER.size + count * CUI_WIDTH
+        self._records_start = self._offsets_start + (count + 1) * _OFFSET.size
+
+    def __len__(self):
+        return self._count
+
+    def _index(self, cui):
+        key = cui.encode("ascii").ljust(CUI_WIDTH, b"\0")
+        index = bisect_left(self._cuis, key)
+        if index < self._count and self._cuis[index] == key:
+            return index
+        return None
+
+    def __contains__(self, cui):
+        return self._index(cui) is not None
+
+    def get(self, cui, default=None):
+        """CompactEntity for a CUI, or default"""
+        index = self._index(cui)
+        if index is None:
+            return default
+        start, = _OFFSET.unpack_from(self._mmap, self._offsets_start + index * _OFFSET.size)
+        end, = _OFFSET.unpack_from(self._mmap, self._offsets_start + (index + 1) * _OFFSET.size)
+        record = self._mmap[self._records_start + start:self._records_start + end].decode("utf-8")
+        canonical_name, types, has_definition = record.split(_SEPARATOR)
+        return CompactEntity(cui, canonical_name, types.split(",") if types else [], has_definition == "1")
+
+    def __getitem__(self, cui):
+        entity = self.get(cui)
+        if entity is None:
+            raise KeyError(cui)
+        return entity
+
+    def close(self):
+        self._mmap.close()
+
+
+def get_table():
+    """The process-wide table, opened on first use; None if not built or out of date"""
+    global _table, _table_loaded
+    if not _table_loaded:
+        with _table_lock:
+            if not _table_loaded:
+                if os.path.exists(TABLE_PATH):
+                    table = UmlsTable(TABLE_PATH)
+                    if table.scispacy_version == _scispacy_version():
+                        _table = table
+                    else:
+                        print(
+                            f"Ignoring {TABLE_PATH}: built with scispacy {table.scispacy_version}, "
+                            f"running {_scispacy_version()}; rebuild it with `python -m src.umls_table`"
+                        )
+                        table.close()
+                _table_loaded = True
+    return _table
+
+
+def lookup_concept(cui, kb=None):
+    """Concept record for a CUI from the compact table, else from kb.cui_to_entity"""
+    table = get_table()
+    if table is not None:
+        concept = table.get(cui)
+        if concept is not None:
+            return concept
+    if kb is None:
+        raise KeyError(cui)
+    return kb.cui_to_entity[cui]
+
+
+def build_table(cui_to_entity, path=TABLE_PATH):
+    """Write the compact table for a scispacy cui_to_entity mapping; returns the record count"""
+    cuis = sorted(cui_to_entity)
+    records = []
+    offsets = [0]
+    for cui in cuis:
+        if len(cui) > CUI_WIDTH:
+            raise ValueError(f"CUI {cui!r} is wider than {CUI_WIDTH} characters")
+        entity = cui_to_entity[cui]
+        record = _SEPARATOR.join([
+            entity.canonical_name.replace(_SEPARATOR, " "),
+            ",".join(entity.types),
+            "1" if entity.definition else "0"
+        ]).encode("utf-8")
+        records.append(record)
+        offsets.append(offsets[-1] + len(record))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, _scispacy_version().encode("ascii")[:32], len(cuis)))
+        f.writelines(cui.encode("ascii").ljust(CUI_WIDTH, b"\0") for cui in cuis)
+        f.writelines(_OFFSET.pack(offset) for offset in offsets)
+        f.writelines(records)
+    os.replace(tmp_path, path)
+    return len(cuis)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=TABLE_PATH, help="Where to write the table")
+    args = parser.parse_args()
+
+    try:
+        from scispacy.linking_utils import UmlsKnowledgeBase
+    except ImportError:  # scispacy < 0.3
+        from scispacy.umls_utils import UmlsKnowledgeBase
+
+    print("Loading the UMLS knowledge base...")
+    kb = UmlsKnowledgeBase()
+    count = build_table(kb.cui_to_entity, args.output)
+    print(f"Wrote {count} concepts to {args.output} ({os.path.getsize(args.output) / (1024 * 1024):.1f} MB)")
@@ -0,0 +1,138 @@
+import numpy as np
+
+# Energy-based voice activity pre-pass: find the voiced stretches of a 16 kHz
+# recording from per-frame RMS levels, hand only those to Whisper, and map the
+# resulting timestamps back onto the original recording.
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+# A frame is voiced when it is this many dB above the recording's noise floor
+THRESHOLD_DB_ABOVE_FLOOR = 12
+# Frames quieter than this are never voiced, whatever the noise floor
+ABSOLUTE_FLOOR_DB = -60
+# Only silences at least this long are cut; shorter pauses stay in as speech rhythm
+MIN_SILENCE_SECONDS = 1.0
+# Audio kept either side of each voiced region so word onsets are not clipped
+PADDING_SECONDS = 0.25
+# Quietest and loudest frames used to judge whether the recording has silences at all
+FLOOR_PERCENTILE = 10
+PEAK_PERCENTILE = 90
+# Keeping less than this share of a recording means detection failed, not that it is silent
+MIN_VOICED_FRACTION = 0.05
+
+
+class VoicedAudio:
+    """Voiced samples of a recording plus the map back to the original timeline
+
+    regions holds (start, end) sample offsets into the original audio; audio
+    is those regions concatenated.
+    """
+
+    def __init__(self, audio, regions, total_samples):
+        self.audio = audio
+        self.regions = regions
+        self.total_samples = total_samples
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        # Start of each region within the concatenated audio
+        self._voiced_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if regions else np.zeros(0, np.int64)
+        self._original_starts = np.array([start for start, _ in regions], dtype=np.int64)
+
+    @property
+    def total_seconds(self):
+        return self.total_samples / SAMPLE_RATE
+
+    @property
+    def voiced_seconds(self):
+        return len(self.audio) / SAMPLE_RATE
+
+    @property
+    def skipped_seconds(self):
+        return self.total_seconds - self.voiced_seconds
+
+    def to_original(self, seconds, is_end=False):
+        """Map a time in the voiced audio to the same instant in the original recording
+
+        A time exactly on a join belongs to the region before it when it is a
+        segment end, and to the region after it when it is a segment start.
+        """
+        if not self.regions:
+            return seconds
+        sample = int(round(seconds * SAMPLE_RATE))
+        side = "left" if is_end else "right"
+        index = max(int(np.searchsorted(self._voiced_starts, sample, side=side)) - 1, 0)
+        original = self._original_starts[index] + sample - self._voiced_starts[index]
+        return float(original) / SAMPLE_RATE
+
+    def report(self):
+        percent = 100 * self.skipped_seconds / self.total_seconds if self.total_samples else 0.0
+        return (
+            f"VAD kept {self.voiced_seconds:.1f}s of {self.total_seconds:.1f}s "
+            f"({self.skipped_seconds:.1f}s / {percent:.0f}% silence skipped, {len(self.regions)} regions)"
+        )
+
+
+def _runs(mask):
+    """(start, end) index pairs of the True runs in a boolean array"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_voiced_regions(audio, frame_ms=FRAME_MS, threshold_db=THRESHOLD_DB_ABOVE_FLOOR,
+                          min_silence_seconds=MIN_SILENCE_SECONDS, padding_seconds=PADDING_SECONDS):
+    """Return [(start, end)] sample ranges of the voiced parts of a float32 recording"""
+    frame = int(SAMPLE_RATE * frame_ms / 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    level_db = 20 * np.log10(rms + 1e-10)
+    noise_floor, peak = np.percentile(level_db, [FLOOR_PERCENTILE, PEAK_PERCENTILE])
+    # Without a clear gap between the quiet and loud frames (continuous talking,
+    # steady background noise) the "floor" is speech itself: keep everything
+    if peak - noise_floor < threshold_db:
+        return [(0, len(audio))]
+    voiced = level_db > max(noise_floor + threshold_db, ABSOLUTE_FLOOR_DB)
+    if not voiced.any():
+        return [(0, len(audio))]
+
+    # Fill pauses shorter than the minimum silence
+    min_gap = int(np.ceil(min_silence_seconds * 1000 / frame_ms))
+    silent_starts, silent_ends = _runs(~voiced)
+    for start, end in zip(silent_starts, silent_ends):
+        if end - start < min_gap and start > 0 and end < n_frames:
+            voiced[start:end] = True
+
+    pad = int(np.ceil(padding_seconds * 1000 / frame_ms))
+    starts, ends = _runs(voiced)
+    starts = np.maximum(starts - pad, 0) * frame
+    ends = np.minimum(ends + pad, n_frames) * frame
+    # The trailing partial frame belongs to the last region if that reaches the end
+    ends[ends == n_frames * frame] = len(audio)
+
+    # Padding can make neighbours touch; merge them
+    regions = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(end, regions[-1][1]))
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def trim_silence(audio, **kwargs):
+    """Drop long silences from a float32 16 kHz recording; returns a VoicedAudio
+
+    Falls back to the untrimmed recording when detection keeps implausibly
+    little of it, so a misjudged noise floor never discards the speech.
+    """
+    regions = detect_voiced_regions(audio, **kwargs)
+    kept = sum(end - start for start, end in regions)
+    if len(audio) and kept < MIN_VOICED_FRACTION * len(audio):
+        regions = [(0, len(audio))]
+    if regions:
+        voiced = np.concatenate([audio[start:end] for start, end in regions])
+    else:
+        voiced = audio[:0]
+    return VoicedAudio(voiced, regions, len(audio))
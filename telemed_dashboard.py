@@ -2,12 +2,21 @@
 
 import streamlit as st
 import json
-import os
 from datetime import datetime
-import tempfile
-from src.transcriber import transcribe_audio
-from src.entity_extractor import extract_entities, categorize_entities
-from src.db_reader import get_session_ids, get_consultation_by_session, get_consultation_transcript, get_session_summary, search_sessions_by_patient, get_all_session_summaries
+import threading
+import time
+from src.transcriber import PRECISIONS, warm_up_model
+from src.entity_extractor import EXTRACTION_MODES
+from src.jobs import JobQueue, QUEUED, RUNNING, SUCCEEDED, FAILED
+from src.db_reader import get_session_ids_page, get_session_summaries_page, get_consultation_by_session, get_consultation_transcript, get_session_summary, search_sessions_by_patient, search_transcripts
+from src.db_schema import ensure_schema
+from src.db_cache import invalidate as invalidate_db_cache
+
+SESSION_PAGE_SIZE = 50
+RECENT_SESSIONS_COUNT = 5
+PATIENT_SEARCH_LIMIT = 50
+TRANSCRIPT_SEARCH_LIMIT = 20
+JOB_POLL_SECONDS = 1
 
 # --- Page config ---
 st.set_page_config(
@@ -96,6 +105,26 @@ if 'session_summary' not in st.session_state:
     st.session_state.session_summary = None
 if 'patient_search' not in st.session_state:
     st.session_state.patient_search = ""
+if 'search_mode' not in st.session_state:
+    st.session_state.search_mode = "Patient info"
+if 'session_page_cursors' not in st.session_state:
+    # Keyset cursors of the session pages visited so far; None is the first page
+    st.session_state.session_page_cursors = [None]
+if 'session_filter_applied' not in st.session_state:
+    st.session_state.session_filter_applied = ""
+if 'audio_job_id' not in st.session_state:
+    st.session_state.audio_job_id = None
+if 'submitted_upload' not in st.session_state:
+    st.session_state.submitted_upload = None
+
+ensure_schema()
+
+@st.cache_resource
+def get_job_queue():
+    # One queue per server process, shared by every browser session
+    return JobQueue()
+
+poll_audio_job = False
 
 # --- Header ---
 st.markdown("""
@@ -107,32 +136,67 @@ st.markdown("""
 
 # --- Patient Search Section ---
 st.markdown("### 🔍 Patient Search")
+search_mode = st.radio("Search in:", ["Patient info", "Transcripts"], horizontal=True, key="search_mode_input")
 col1, col2 = st.columns([3, 1])
 
 with col1:
-    patient_search = st.text_input(
-        "Search by patient information (session ID, age, gender):",
-        placeholder="e.g., consult_001, 35, Female...",
-        key="patient_search_input"
-    )
+    if search_mode == "Transcripts":
+        patient_search = st.text_input(
+            "Search what was said in the consultation:",
+            placeholder='e.g., azithromycin, chest x-ray, "shortness of breath"...',
+            key="patient_search_input"
+        )
+    else:
+        patient_search = st.text_input(
+            "Search by patient information (session ID prefix, age or age range, gender):",
+            placeholder="e.g., consult_001, 35, 30-40, >=65, female 30-40...",
+            key="patient_search_input"
+        )
 
 with col2:
     if st.button("🔍 Search Patient", type="primary"):
         if patient_search.strip():
             st.session_state.patient_search = patient_search.strip()
+            st.session_state.search_mode = search_mode
             st.success(f"Searching for: {patient_search}")
             st.rerun()
 
 # --- Display Search Results ---
-if st.session_state.patient_search:
+if st.session_state.patient_search and st.session_state.search_mode == "Transcripts":
+    st.markdown("---")
+    st.markdown("### 📋 Transcript Matches")
+    
+    try:
+        transcript_results = search_transcripts(st.session_state.patient_search, limit=TRANSCRIPT_SEARCH_LIMIT)
+        
+        if transcript_results:
+            st.success(f"Found {len(transcript_results)} matching transcripts")
+            
+            for i, result in enumerate(transcript_results):
+                with st.expander(f"Session: {result['session_id']} - relevance {result['score']:.2f}", expanded=i < 3):
+                    st.markdown(result["snippet"])
+                    if st.button(f"📂 Load Session {i}", key=f"load_transcript_{result['session_id']}"):
+                        st.session_state.current_session = result['session_id']
+                        st.rerun()
+        else:
+            st.warning("No transcripts found matching your search.")
+            st.info('Try fewer or different words, or quote an exact phrase like "chest x-ray".')
+            
+    except Exception as e:
+        st.error(f"Search error: {str(e)}")
+
+elif st.session_state.patient_search:
     st.markdown("---")
     st.markdown("### 📋 Search Results")
     
     try:
-        search_results = search_sessions_by_patient(st.session_state.patient_search)
+        search_results = search_sessions_by_patient(st.session_state.patient_search, limit=PATIENT_SEARCH_LIMIT)
         
         if search_results:
-            st.success(f"Found {len(search_results)} matching sessions")
+            if len(search_results) >= PATIENT_SEARCH_LIMIT:
+                st.success(f"Showing the {PATIENT_SEARCH_LIMIT} most recent matching sessions")
+            else:
+                st.success(f"Found {len(search_results)} matching sessions")
             
             # Display search results in a table
             for i, result in enumerate(search_results):
@@ -150,7 +214,7 @@ if st.session_state.patient_search:
                             st.rerun()
         else:
             st.warning("No sessions found matching your search criteria.")
-            st.info("Try searching by session ID, age, or gender.")
+            st.info("Try searching by session ID prefix, age (35), age range (30-40, >=65), or gender.")
             
     except Exception as e:
         st.error(f"Search error: {str(e)}")
@@ -159,9 +223,37 @@ if st.session_state.patient_search:
 with st.sidebar:
     st.markdown("### 🗂️ Session Selection")
     
-    # Fetch session IDs from database
+    # Fetch one page of session IDs from database
     try:
-        session_ids = get_session_ids()
+        session_filter = st.text_input(
+            "Find session:",
+            placeholder="Type the start of a session ID...",
+            key="session_filter"
+        ).strip()
+        
+        # A new filter starts paging from the top again
+        if session_filter != st.session_state.session_filter_applied:
+            st.session_state.session_filter_applied = session_filter
+            st.session_state.session_page_cursors = [None]
+        
+        page_ids = get_session_ids_page(
+            after=st.session_state.session_page_cursors[-1],
+            limit=SESSION_PAGE_SIZE + 1,
+            prefix=session_filter or None
+        )
+        has_next_page = len(page_ids) > SESSION_PAGE_SIZE
+        session_ids = page_ids[:SESSION_PAGE_SIZE]
+        
+        if has_next_page or len(st.session_state.session_page_cursors) > 1:
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if st.button("◀ Previous", disabled=len(st.session_state.session_page_cursors) == 1):
+                    st.session_state.session_page_cursors.pop()
+                    st.rerun()
+            with col_next:
+                if st.button("Next ▶", disabled=not has_next_page):
+                    st.session_state.session_page_cursors.append(session_ids[-1])
+                    st.rerun()
         
         if session_ids:
             # Session selection dropdown
@@ -222,11 +314,9 @@ with st.sidebar:
             st.markdown("---")
             st.markdown("### 📅 Recent Sessions")
             
-            # Get all session summaries for quick overview
-            all_summaries = get_all_session_summaries()
-            if all_summaries:
-                # Show last 5 sessions
-                recent_sessions = all_summaries[:5]
+            # Fetch only the most recent sessions for quick overview
+            recent_sessions = get_session_summaries_page(limit=RECENT_SESSIONS_COUNT)
+            if recent_sessions:
                 for summary in recent_sessions:
                     with st.expander(f"{summary['session_id']} - {summary['timestamp'].strftime('%m/%d %H:%M')}", expanded=False):
                         st.write(f"**Age:** {summary['patient_age'] or '—'}")
@@ -236,6 +326,8 @@ with st.sidebar:
                         if st.button(f"Load {summary['session_id']}", key=f"quick_load_{summary['session_id']}"):
                             st.session_state.current_session = summary['session_id']
                             st.rerun()
+        elif session_filter:
+            st.warning(f"No sessions starting with '{session_filter}'.")
         else:
             st.warning("No consultation sessions found in database.")
             st.info("Please ensure the database is connected and contains consultation data.")
@@ -254,6 +346,7 @@ with st.sidebar:
         st.rerun()
     
     if st.button("🔄 Refresh Sessions", type="secondary"):
+        invalidate_db_cache()
         st.rerun()
     
     st.markdown("---")
@@ -264,21 +357,23 @@ with st.sidebar:
     
     if upload_option == "Audio File":
         uploaded_audio = st.file_uploader("Upload audio", type=['mp3', 'wav', 'm4a'])
-        if uploaded_audio:
-            with st.spinner("Transcribing..."):
-                try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_audio.name.split('.')[-1]}") as tmp_file:
-                        tmp_file.write(uploaded_audio.getvalue())
-                        tmp_file_path = tmp_file.name
-                    
-                    transcript_text = transcribe_audio(tmp_file_path)
-                    os.unlink(tmp_file_path)
-                    
-                    st.session_state.transcript = transcript_text
-                    st.success("Audio transcribed!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+        # Submit each upload once, keyed on Streamlit's id for it, so the poll
+        # reruns neither re-read nor re-hash the recording; the job queue hashes
+        # it once and serves audio seen before from the content-hash cache
+        upload_key = uploaded_audio.file_id if uploaded_audio else None
+        if uploaded_audio and upload_key != st.session_state.submitted_upload:
+            try:
+                st.session_state.audio_job_id = get_job_queue().submit_audio(
+                    uploaded_audio.getvalue(),
+                    model_size=st.session_state.get("whisper_model", "base"),
+                    precision=st.session_state.get("whisper_precision", "default"),
+                    vad=st.session_state.get("vad", False),
+                    extract=st.session_state.get("auto_extract", True),
+                    extraction_mode=st.session_state.get("extraction_mode", "full")
+                )
+                st.session_state.submitted_upload = upload_key
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
     
     elif upload_option == "Transcript File":
         uploaded_file = st.file_uploader("Upload transcript", type=['txt'])
@@ -295,12 +390,57 @@ with st.sidebar:
                 st.success("Transcript saved!")
                 st.rerun()
     
+    
+    # Background audio job status
+    if st.session_state.audio_job_id:
+        job = get_job_queue().status(st.session_state.audio_job_id)
+        if job is None:
+            st.session_state.audio_job_id = None
+        elif job["state"] in (QUEUED, RUNNING):
+            skipped = f", {job['skipped_seconds']:.0f}s of silence skipped" if job["skipped_seconds"] else ""
+            st.info(f"{job['stage']}... {job['decoded_seconds']:.0f}s decoded{skipped}")
+            if job["transcript"]:
+                st.text(job["transcript"])
+            if st.button("⏹ Cancel Transcription"):
+                get_job_queue().cancel(job["id"])
+            poll_audio_job = True
+        else:
+            st.session_state.audio_job_id = None
+            if job["state"] == SUCCEEDED:
+                result = job["result"]
+                st.session_state.transcript = result["transcript"]
+                if result["structured_data"] is not None:
+                    st.session_state.structured_data = result["structured_data"]
+                if result["session_id"]:
+                    st.session_state.current_session = result["session_id"]
+                st.rerun()
+            elif job["state"] == FAILED:
+                st.error(f"Error: {job['error']}")
+            else:
+                st.warning("Transcription cancelled.")
     st.markdown("---")
     
     # Settings
     st.markdown("### 🔧 Settings")
-    model_size = st.selectbox("Whisper Model", ["tiny", "base", "small", "medium", "large"], index=1)
-    auto_extract = st.checkbox("Auto-extract entities", value=True)
+    model_size = st.selectbox("Whisper Model", ["tiny", "base", "small", "medium", "large"], index=1, key="whisper_model")
+    precision = st.selectbox(
+        "Inference Mode", list(PRECISIONS), index=0, key="whisper_precision",
+        help="cpu-fast: int8-quantized model on CPU, for machines without a GPU"
+    )
+    
+    # Preload the chosen model in the background so the next upload skips the load
+    if st.session_state.get("warmed_model") != (model_size, precision):
+        threading.Thread(target=warm_up_model, kwargs={"model_size": model_size, "precision": precision}, daemon=True).start()
+        st.session_state.warmed_model = (model_size, precision)
+    
+    auto_extract = st.checkbox("Auto-extract entities", value=True, key="auto_extract")
+    st.selectbox(
+        "Extraction Mode", list(EXTRACTION_MODES), index=0, key="extraction_mode",
+        help="fast: curated vocabulary match, full UMLS linking only for unmatched terms; "
+             "sessions saved this way are re-extracted by the next backfill"
+    )
+    st.checkbox("Skip silence before transcribing", value=False, key="vad",
+                help="Energy-based voice detection; only voiced audio is sent to Whisper")
     
     if st.button("🔄 Clear All Data"):
         st.session_state.clear()
@@ -448,4 +588,9 @@ st.markdown("""
     <p>🩺 Telemedicine Consultation Review System | Built with Streamlit & MariaDB</p>
     <p>Session: {}</p>
 </div>
-""".format(datetime.now().strftime('%B %d, %Y – %H:%M:%S')), unsafe_allow_html=True)
\ No newline at end of file
+""".format(datetime.now().strftime('%B %d, %Y – %H:%M:%S')), unsafe_allow_html=True)
+
+# Keep polling while a background audio job is running
+if poll_audio_job:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
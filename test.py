@@ -27,4 +27,4 @@ print(json.dumps(categorized, indent=2))
 save_entities_to_json(categorized, ENTITY_JSON_PATH)
 
 # Store in database
-store_consultation(categorized, session_id="consult_002")
\ No newline at end of file
+store_consultation(categorized, session_id="consult_002", entities=entities, transcript=text)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import pytest
+
+from src.categorizer import CategorizationRules, RULES_PATH
+
+# The elif chain categorize_entities used before the rules file, kept verbatim
+# as the reference: the shipped rules (version 1) must categorize identically.
+SYMPTOM_TYPES = {"T184"}
+MEDICATION_TYPES = {"T121", "T200"}
+PROCEDURE_TYPES = {"T061"}
+DIAGNOSIS_TYPES = {"T047"}
+
+
+def legacy_category(ent):
+    types = set(ent["semantic_types"])
+    token = ent["text"].lower()
+
+    if SYMPTOM_TYPES & types:
+        return "symptoms"
+    elif MEDICATION_TYPES & types:
+        return "medications"
+    elif PROCEDURE_TYPES & types:
+        return "procedures"
+    elif DIAGNOSIS_TYPES & types:
+        return "diagnosis"
+    elif any(inst in token for inst in ["rest", "follow up", "monitoring", "advised", "hydrated", "take", "prescribed"]):
+        return "instructions"
+    elif "year-old" in token:
+        return "age"
+    elif "female" in token or "male" in token:
+        return "gender"
+    else:
+        return "other"
+
+
+CASES = [
+    # Type priority: the earliest type rule wins whatever the order of the types
+    (["T184"], "headache", "symptoms"),
+    (["T047", "T184"], "fever", "symptoms"),
+    (["T047", "T121"], "aspirin", "medications"),
+    (["T200"], "amoxicillin 500 mg", "medications"),
+    (["T061", "T047"], "appendectomy", "procedures"),
+    (["T047"], "type 2 diabetes", "diagnosis"),
+    # Types win over keywords
+    (["T047"], "advised rest", "diagnosis"),
+    (["T999", "T184"], "take a breath", "symptoms"),
+    # Keyword priority: instructions, then age, then gender, anywhere in the mention
+    ([], "bed rest", "instructions"),
+    ([], "Follow up in two weeks", "instructions"),
+    ([], "45-year-old male advised to rest", "instructions"),
+    ([], "45-year-old male", "age"),
+    ([], "a male who is 45-year-old", "age"),
+    ([], "interest", "instructions"),
+    # "female" vs "male": both are gender, and "male" is found inside "female"
+    ([], "female", "gender"),
+    ([], "Male patient", "gender"),
+    ([], "FEMALE", "gender"),
+    ([], "males", "gender"),
+    # Default
+    ([], "stethoscope", "other"),
+    (["T999"], "clinic", "other"),
+    ([], "", "other"),
+]
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return CategorizationRules.load(RULES_PATH)
+
+
+@pytest.mark.parametrize("types, text, expected", CASES)
+def test_rules_match_legacy_chain(rules, types, text, expected):
+    ent = {"semantic_types": types, "text": text}
+    assert legacy_category(ent) == expected
+    assert rules.category(types, text) == expected
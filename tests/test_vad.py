@@ -0,0 +1,38 @@
+import numpy as np
+
+from src.vad import SAMPLE_RATE, trim_silence
+
+
+def _speech_like(seconds, noise=0.0, seed=0):
+    """A voiced tone whose loudness wanders by about 8 dB, like continuous talking"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.3 * 10 ** (0.2 * np.sin(2 * np.pi * 3 * t))
+    audio = envelope * np.sin(2 * np.pi * 220 * t) + noise * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
+
+def test_continuous_speech_is_kept_whole():
+    for noise in (0.0, 0.05, 0.1):
+        audio = _speech_like(20, noise=noise)
+        voiced = trim_silence(audio)
+        assert voiced.regions == [(0, len(audio))]
+        assert len(voiced.audio) == len(audio)
+        assert voiced.skipped_seconds == 0
+
+
+def test_long_silence_is_cut():
+    rng = np.random.default_rng(1)
+    silence = (0.001 * rng.standard_normal(5 * SAMPLE_RATE)).astype(np.float32)
+    audio = np.concatenate([_speech_like(2), silence, _speech_like(2, seed=2)])
+    voiced = trim_silence(audio)
+    assert len(voiced.regions) == 2
+    assert voiced.skipped_seconds > 4
+    # The second utterance still starts where it did in the recording
+    assert abs(voiced.to_original(voiced.regions[0][1] / SAMPLE_RATE) - voiced.regions[1][0] / SAMPLE_RATE) < 0.01
+
+
+def test_all_quiet_recording_is_not_discarded():
+    audio = np.zeros(3 * SAMPLE_RATE, dtype=np.float32)
+    voiced = trim_silence(audio)
+    assert len(voiced.audio) == len(audio)